@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+靜態資源預壓縮工具
+
+為 App Shell 與公開資源產生最高壓縮等級的 .gz / .br / .zst 副檔，
+dev-tools/server.py 會依 Accept-Encoding 直接串流這些副檔，省去執行期壓縮。
+副檔的 mtime 會同步為原檔 mtime，原檔變更後伺服器即不再使用舊副檔。
+
+brotli 與 zstandard 為可選依賴，未安裝時僅略過對應格式。
+"""
+import argparse
+import gzip
+import os
+import sys
+from pathlib import Path
+
+from server import PRECOMPRESSED_ENCODINGS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_FILES = (
+    'index.html',
+    'app.js',
+    'fx.worker.js',
+    'sw.js',
+    'styles.css',
+    'api/answers.json',
+    'llms.txt',
+    'sitemap.xml',
+)
+
+
+def _compress_gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _compress_brotli(data):
+    return brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+
+
+def _compress_zstd(data):
+    return zstandard.ZstdCompressor(level=22).compress(data)
+
+
+def available_compressors():
+    """回傳 {encoding: compress_fn}，未安裝的可選依賴會被略過"""
+    compressors = {'gzip': _compress_gzip}
+    if brotli is not None:
+        compressors['br'] = _compress_brotli
+    if zstandard is not None:
+        compressors['zstd'] = _compress_zstd
+    return compressors
+
+
+def precompress_file(path, compressors):
+    """為單一檔案寫入各格式副檔，回傳 [(encoding, 原始大小, 壓縮大小)]"""
+    stat = path.stat()
+    data = path.read_bytes()
+    results = []
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        compress = compressors.get(encoding)
+        if compress is None:
+            continue
+        sidecar = path.with_name(path.name + suffix)
+        body = compress(data)
+        if len(body) >= len(data):
+            # 壓縮後沒有變小，移除舊副檔讓伺服器回傳原檔
+            sidecar.unlink(missing_ok=True)
+            continue
+        # 先寫入暫存檔再替換，避免伺服器讀到寫到一半的副檔
+        tmp_path = sidecar.with_name(sidecar.name + '.tmp')
+        tmp_path.write_bytes(body)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, sidecar)
+        results.append((encoding, len(data), len(body)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='產生 .gz/.br/.zst 預壓縮副檔')
+    parser.add_argument('files', nargs='*', default=list(DEFAULT_FILES),
+                        help='相對於 --root 的檔案（預設為 App Shell 靜態資源）')
+    parser.add_argument('--root', default='.', help='靜態資源根目錄（預設目前目錄）')
+    args = parser.parse_args(argv)
+
+    compressors = available_compressors()
+    missing = [name for name, module in (('brotli', brotli), ('zstandard', zstandard)) if module is None]
+    if missing:
+        print(f"⚠️  未安裝 {', '.join(missing)}，略過對應格式")
+
+    root = Path(args.root)
+    for name in args.files:
+        path = root / name
+        if not path.is_file():
+            print(f"⚠️  找不到檔案: {path}")
+            continue
+        for encoding, original, compressed in precompress_file(path, compressors):
+            print(f"✅ {name} [{encoding}] {original} → {compressed} bytes ({compressed / original:.1%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,850 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
+import ctypes
+import ctypes.util
+import datetime
+import email.utils
+import errno
+import fnmatch
+import html.parser
 import http.server
+import io
+import json
+import mmap
+import posixpath
+import re
+import select
+import signal
+import socket
 import socketserver
-import gzip
+import struct
+import sys
+import hashlib
 import os
 import mimetypes
+import threading
+import time
+import traceback
+import urllib.parse
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from stat import S_ISREG
+
+PORT = 5500
+BACKENDS = ('single', 'threaded', 'asyncio')
+DEFAULT_MAX_WORKERS = 32
+KEEP_ALIVE_TIMEOUT = 15
+METRICS_PATH = '/__metrics'
+ASSET_MANIFEST_PATH = '/__asset-manifest'
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/javascript', 'application/javascript',
+    'text/plain', 'application/json', 'text/xml', 'application/xml'
+)
+GZIP_LEVEL = 9
+GZIP_WBITS = 31  # zlib 輸出 gzip 格式（標頭 mtime 為 0）
+# 超過此大小的可壓縮檔案改用串流壓縮，不進入快取
+DEFAULT_STREAM_THRESHOLD = 512 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+# 資源索引不收錄的目錄（仍可由原始處理器提供）
+INDEX_EXCLUDED_DIRS = frozenset({'.git', 'node_modules', '__pycache__', '.jest-cache'})
+DEFAULT_POLL_INTERVAL = 1.0
+# 網路節流設定檔：(延遲毫秒, 下行頻寬 kbit/s)，參考 Chrome DevTools 預設值
+THROTTLE_PROFILES = {
+    'slow-3g': (2000, 400),
+    'fast-3g': (562.5, 1600),
+    '4g': (170, 9000),
+}
+# 預壓縮副檔（由 precompress.py 產生），依伺服器偏好排序
+PRECOMPRESSED_ENCODINGS = (
+    ('br', '.br'),
+    ('zstd', '.zst'),
+    ('gzip', '.gz'),
+)
+
+
+class VersionedLRUCache:
+    """有容量上限的 LRU 快取，以 (path, mtime, size) 判斷檔案版本"""
+
+    def __init__(self, max_entries=128, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, mtime, size):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != (mtime, size):
+                # 檔案已變更，舊的內容作廢
+                self._drop(path)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path, mtime, size, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if path in self._entries:
+                self._drop(path)
+            self._entries[path] = ((mtime, size), value)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, path):
+        _, value = self._entries.pop(path)
+        self._bytes -= len(value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def parse_accept_encoding(header_value):
+    """解析 Accept-Encoding，回傳 {coding: q}"""
+    accepted = {}
+    for item in header_value.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def _etag_matches(header_value, etag):
+    # If-None-Match 使用弱比較（RFC 9110 §13.1.2）
+    if header_value.strip() == '*':
+        return True
+    for candidate in header_value.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+AssetEntry = namedtuple('AssetEntry', (
+    'url',            # 相對 URL 路徑，例如 'api/answers.json'
+    'path',           # 檔案絕對路徑
+    'mime_type',
+    'size',
+    'mtime_ns',
+    'last_modified',  # HTTP 日期字串
+    'compressible',   # 是否值得即時 gzip
+    'cache_control',
+    'sidecars',       # ((encoding, suffix, size), ...)，依偏好排序且 mtime 與原檔一致
+))
+
+
+def guess_mime_type(path):
+    mime_type, encoding = mimetypes.guess_type(path)
+    if encoding:
+        # .gz/.br 等壓縮檔本身以二進位內容提供
+        return 'application/octet-stream'
+    return mime_type or 'application/octet-stream'
+
+
+class CacheRule(namedtuple('CacheRule', (
+        'pattern', 'max_age', 'immutable', 'stale_while_revalidate', 'no_cache'))):
+    """Cache-Control 規則：pattern 為相對 URL 的 glob，依序比對，第一條符合者生效"""
+
+    __slots__ = ()
+
+    def __new__(cls, pattern, max_age=0, immutable=False, stale_while_revalidate=None, no_cache=False):
+        return super().__new__(cls, pattern, max_age, immutable, stale_while_revalidate, no_cache)
+
+    @property
+    def cache_control(self):
+        if self.no_cache:
+            return 'no-cache'
+        parts = ['public', f'max-age={self.max_age}']
+        if self.immutable:
+            parts.append('immutable')
+        if self.stale_while_revalidate:
+            parts.append(f'stale-while-revalidate={self.stale_while_revalidate}')
+        return ', '.join(parts)
+
+
+DEFAULT_CACHE_RULES = (
+    # Service Worker 必須每次重新驗證，才能及時取得新版本
+    CacheRule('sw.js', no_cache=True),
+    CacheRule('fonts/*', max_age=31536000),
+    CacheRule('images/*', max_age=31536000),
+    CacheRule('icons/*', max_age=31536000),
+    CacheRule('*', max_age=3600),
+)
+# 內容雜湊網址（例如 app.3f2a9c1b7e.js）內容永不改變
+IMMUTABLE_CACHE_CONTROL = CacheRule('*', max_age=31536000, immutable=True).cache_control
+# 錯誤回應不快取
+ERROR_CACHE_CONTROL = 'no-store'
+FINGERPRINT_LENGTH = 10
+# HTML 回應附帶的 preload Link 數量上限
+MAX_PRELOAD_LINKS = 8
+# 沒有副檔名的檔案（例如 .editorconfig）雜湊接在檔名最後
+FINGERPRINT_PATTERN = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)?$' % FINGERPRINT_LENGTH)
+
+
+def load_cache_rules(path):
+    """從 JSON 檔載入規則：[{"pattern": "fonts/*", "max_age": 31536000, "immutable": false, ...}]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return tuple(CacheRule(**rule) for rule in json.load(f))
+
+
+def cache_policy(url, rules=DEFAULT_CACHE_RULES):
+    for rule in rules:
+        if fnmatch.fnmatchcase(url, rule.pattern):
+            return rule.cache_control
+    return None
+
+
+def fingerprint_url(url, etag):
+    """以內容雜湊產生指紋網址，例如 app.js → app.3f2a9c1b7e.js"""
+    stem, ext = posixpath.splitext(url)
+    return f'{stem}.{etag.strip(chr(34))[:FINGERPRINT_LENGTH]}{ext}'
+
+
+def describe_asset(url, path, stat, sidecar_stats, cache_rules=DEFAULT_CACHE_RULES):
+    """由 stat 結果建立索引項目；sidecar_stats 為 {suffix: stat}"""
+    mime_type = guess_mime_type(path)
+    sidecars = tuple(
+        (encoding, suffix, sidecar_stats[suffix].st_size)
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS
+        if suffix in sidecar_stats and sidecar_stats[suffix].st_mtime_ns == stat.st_mtime_ns
+    )
+    return AssetEntry(
+        url=url,
+        path=path,
+        mime_type=mime_type,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        last_modified=email.utils.formatdate(stat.st_mtime_ns // 10**9, usegmt=True),
+        compressible=mime_type in COMPRESSIBLE_TYPES and stat.st_size > 1024,  # 只壓縮大於1KB的文件
+        cache_control=cache_policy(url, cache_rules),
+        sidecars=sidecars,
+    )
+
+
+def stat_asset(url, path, cache_rules=DEFAULT_CACHE_RULES):
+    """逐次查詢檔案系統建立項目，檔案不存在時回傳 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not S_ISREG(stat.st_mode):
+        return None
+    sidecar_stats = {}
+    for _, suffix in PRECOMPRESSED_ENCODINGS:
+        try:
+            sidecar_stats[suffix] = os.stat(path + suffix)
+        except OSError:
+            pass
+    return describe_asset(url, path, stat, sidecar_stats, cache_rules)
+
+
+class AssetIndex:
+    """啟動時建立的靜態資源索引：URL → AssetEntry，熱路徑只需查表"""
+
+    def __init__(self, root, cache_rules=DEFAULT_CACHE_RULES):
+        self.root = os.path.abspath(root)
+        self.cache_rules = cache_rules
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.rebuild()
+
+    def lookup(self, url):
+        return self._entries.get(url)
+
+    def urls(self):
+        return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _url_for(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _scan(self, directory):
+        entries = {}
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if name not in INDEX_EXCLUDED_DIRS]
+            stats = {}
+            for name in filenames:
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                if S_ISREG(stat.st_mode):
+                    stats[name] = stat
+            for name, stat in stats.items():
+                path = os.path.join(dirpath, name)
+                sidecar_stats = {
+                    suffix: stats[name + suffix]
+                    for _, suffix in PRECOMPRESSED_ENCODINGS if name + suffix in stats
+                }
+                url = self._url_for(path)
+                entries[url] = describe_asset(url, path, stat, sidecar_stats, self.cache_rules)
+        return entries
+
+    def rebuild(self):
+        entries = self._scan(self.root)
+        with self._lock:
+            self._entries = entries
+
+    def refresh(self, path):
+        """檔案或目錄變更時更新相關項目"""
+        path = os.path.abspath(path)
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return
+        url = self._url_for(path)
+        if any(part in INDEX_EXCLUDED_DIRS for part in url.split('/')):
+            return
+        with self._lock:
+            if os.path.isdir(path):
+                self._entries.update(self._scan(path))
+                return
+            entry = stat_asset(url, path, self.cache_rules)
+            if entry is not None:
+                self._entries[url] = entry
+            else:
+                # 檔案或整個目錄被移除
+                self._entries.pop(url, None)
+                prefix = url + '/'
+                for key in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[key]
+            # 預壓縮副檔變更時，原檔的可用副檔清單也要更新
+            for _, suffix in PRECOMPRESSED_ENCODINGS:
+                if url.endswith(suffix):
+                    source_url = url[:-len(suffix)]
+                    source = stat_asset(source_url, path[:-len(suffix)], self.cache_rules)
+                    if source is not None:
+                        self._entries[source_url] = source
+
+    def watch(self, mode='auto', poll_interval=DEFAULT_POLL_INTERVAL):
+        """啟動背景監看：inotify 優先，不可用時改為輪詢"""
+        if mode in ('auto', 'inotify'):
+            try:
+                self._watcher = InotifyWatcher(self)
+            except OSError as e:
+                if mode == 'inotify':
+                    raise
+                print(f"⚠️  inotify 無法使用（{e}），改用輪詢監看")
+        if self._watcher is None:
+            self._watcher = PollingWatcher(self, poll_interval)
+        self._watcher.start()
+        return self
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+
+class PollingWatcher(threading.Thread):
+    """定期重建索引的備援監看器"""
+
+    def __init__(self, index, interval):
+        super().__init__(name='asset-index-poll', daemon=True)
+        self.index = index
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.index.rebuild()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class InotifyWatcher(threading.Thread):
+    """以 Linux inotify（透過 ctypes）監看資源目錄"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                  IN_MOVED_TO | IN_CREATE | IN_DELETE)
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, index):
+        super().__init__(name='asset-index-inotify', daemon=True)
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify 僅支援 Linux')
+        self.index = index
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watches = {}
+        self._stop_event = threading.Event()
+        self._add_tree(index.root)
+
+    def _add_tree(self, directory):
+        for dirpath, dirnames, _ in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if name not in INDEX_EXCLUDED_DIRS]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self.WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if dirpath == directory and directory == self.index.root:
+                    raise OSError(err, os.strerror(err), dirpath)
+                continue
+            self._watches[wd] = dirpath
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([self._fd], [], [], 0.5)
+                if not readable:
+                    continue
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self._dispatch(data)
+        finally:
+            os.close(self._fd)
+
+    def _dispatch(self, data):
+        offset = 0
+        changed = set()
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                # 事件佇列溢位，直接全量重建
+                self.index.rebuild()
+                return
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                if name not in INDEX_EXCLUDED_DIRS:
+                    self._add_tree(path)
+            changed.add(path)
+        for path in changed:
+            self.index.refresh(path)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+ThrottleProfile = namedtuple('ThrottleProfile', ('name', 'latency_ms', 'bandwidth_kbps'))
+
+
+def make_throttle(name, latency_ms=None, bandwidth_kbps=None):
+    """依設定檔名稱建立節流設定，latency_ms/bandwidth_kbps 可覆寫預設值"""
+    if name is None:
+        return None
+    if name == 'custom':
+        base_latency, base_bandwidth = 0, None
+    else:
+        base_latency, base_bandwidth = THROTTLE_PROFILES[name]
+    return ThrottleProfile(
+        name=name,
+        latency_ms=base_latency if latency_ms is None else latency_ms,
+        bandwidth_kbps=base_bandwidth if bandwidth_kbps is None else bandwidth_kbps,
+    )
+
+
+class Pacer:
+    """每條連線的頻寬節流器，計算送出下一段資料前需等待的時間"""
+
+    def __init__(self, bandwidth_kbps):
+        self.bytes_per_second = bandwidth_kbps * 1000 / 8
+        # 每段約 50ms 的資料量，讓傳輸速率平順
+        self.chunk_size = max(int(self.bytes_per_second / 20), 512)
+        self._next_send = 0.0
+
+    def reserve(self, nbytes):
+        now = time.monotonic()
+        # 閒置時間不累積額度，避免突發傳輸
+        start = max(self._next_send, now)
+        self._next_send = start + nbytes / self.bytes_per_second
+        return start - now
+
+
+class ThrottledWriter:
+    """包裝 wfile，依頻寬上限分段延遲寫入"""
+
+    def __init__(self, raw, pacer):
+        self._raw = raw
+        self._pacer = pacer
+
+    def write(self, data):
+        view = memoryview(data)
+        size = self._pacer.chunk_size
+        for offset in range(0, len(view), size):
+            piece = view[offset:offset + size]
+            delay = self._pacer.reserve(len(piece))
+            if delay > 0:
+                time.sleep(delay)
+            self._raw.write(piece)
+        return len(view)
+
+    def flush(self):
+        self._raw.flush()
+
+    def close(self):
+        self._raw.close()
+
+    @property
+    def closed(self):
+        return self._raw.closed
+
+
+class TraceRecorder:
+    """將請求序列（相對時間、連線、請求標頭、回應結果）以 JSON Lines 寫入追蹤檔，供 trace_replay.py 重播"""
+
+    # 影響快取與壓縮路徑的請求標頭；其餘標頭不記錄
+    RECORDED_HEADERS = (
+        'Accept', 'Accept-Encoding', 'Cache-Control', 'Pragma', 'If-None-Match', 'If-Modified-Since',
+        'Range', 'If-Range', 'Service-Worker', 'Sec-Fetch-Dest', 'Sec-Fetch-Mode', 'Sec-Fetch-Site',
+    )
+
+    def __init__(self, path, label=None):
+        self.path = path
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # 行緩衝搭配 O_APPEND，prefork 工作行程共用同一檔案時每行仍完整寫入
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+        self._write({
+            'trace': 1,
+            'label': label,
+            'started': datetime.datetime.fromtimestamp(self.started, datetime.timezone.utc).isoformat(),
+            'pid': os.getpid(),
+        })
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+
+    def record(self, handler, request, duration):
+        headers = {name: handler.headers[name] for name in self.RECORDED_HEADERS if name in handler.headers}
+        host, port = handler.client_address[:2]
+        self._write({
+            't': round(request.wall_started - self.started, 6),
+            # 同一 TCP 連線的請求在重播時沿用同一條 keep-alive 連線
+            'conn': f'{os.getpid()}:{host}:{port}',
+            'method': handler.command,
+            'path': handler.path,
+            'headers': headers,
+            'status': request.status,
+            'encoding': request.encoding,
+            'bytes_out': request.bytes_out,
+            'duration_ms': round(duration * 1000, 3),
+        })
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class CriticalResourceParser(html.parser.HTMLParser):
+    """從 HTML 擷取關鍵子資源（CSS、JS、Worker、字型、Manifest），轉為 preload Link 值"""
+
+    WORKER_PATTERN = re.compile(r"""new\s+(?:Shared)?Worker\(\s*['"]([^'"]+)['"]\s*(,\s*\{[^}]*type\s*:\s*['"]module['"])?""")
+    FONT_URL_PATTERN = re.compile(r"""url\(\s*['"]?([^'")]+\.(woff2?|ttf|otf))['"]?\s*\)""")
+    FONT_TYPES = {'woff2': 'font/woff2', 'woff': 'font/woff', 'ttf': 'font/ttf', 'otf': 'font/otf'}
+    # 依重要性排序：樣式與字型阻塞首次繪製，其次是腳本與 Worker
+    PRIORITY = ('style', 'font', 'script', 'worker', 'manifest')
+
+    def __init__(self, base_url='/'):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.resources = {}  # url -> (kind, link value)
+        self._inline = None
+
+    def _add(self, href, kind, value):
+        if not href or href.startswith(('data:', 'blob:', '#')):
+            return
+        url = urllib.parse.urljoin(self.base_url, href)
+        if urllib.parse.urlsplit(url).netloc:
+            # 只預載同源資源
+            return
+        url = posixpath.normpath(url)
+        self.resources.setdefault(url, (kind, f'<{url}>; {value}'))
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        if tag == 'link':
+            rels = attrs.get('rel', '').lower().split()
+            href = attrs.get('href')
+            if 'stylesheet' in rels:
+                self._add(href, 'style', 'rel=preload; as=style')
+            elif 'modulepreload' in rels:
+                self._add(href, 'script', 'rel=modulepreload')
+            elif 'preload' in rels and attrs.get('as'):
+                kind = attrs['as']
+                value = f'rel=preload; as={kind}'
+                if attrs.get('type'):
+                    value += f'; type="{attrs["type"]}"'
+                if 'crossorigin' in attrs or kind == 'font':
+                    value += '; crossorigin'
+                self._add(href, kind, value)
+            elif 'manifest' in rels:
+                # 瀏覽器不支援以 preload 取得 manifest，改用低優先權 prefetch 暖快取
+                self._add(href, 'manifest', 'rel=prefetch')
+        elif tag == 'script':
+            if attrs.get('src'):
+                if attrs.get('type') == 'module':
+                    self._add(attrs['src'], 'script', 'rel=modulepreload')
+                else:
+                    self._add(attrs['src'], 'script', 'rel=preload; as=script')
+            else:
+                self._inline = 'script'
+        elif tag == 'style':
+            self._inline = 'style'
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style'):
+            self._inline = None
+
+    def handle_data(self, data):
+        if self._inline == 'script':
+            for href, module in self.WORKER_PATTERN.findall(data):
+                self._add(href, 'worker', 'rel=modulepreload; as=worker' if module else 'rel=preload; as=worker')
+        elif self._inline == 'style':
+            for href, ext in self.FONT_URL_PATTERN.findall(data):
+                self._add(href, 'font', f'rel=preload; as=font; type="{self.FONT_TYPES[ext]}"; crossorigin')
+
+    def links(self, limit=MAX_PRELOAD_LINKS):
+        ordered = sorted(self.resources.values(), key=lambda item: self.PRIORITY.index(item[0])
+                         if item[0] in self.PRIORITY else len(self.PRIORITY))
+        return tuple(value for _, value in ordered[:limit])
+
+
+def extract_preload_links(path, url):
+    parser = CriticalResourceParser(base_url='/' + url)
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        parser.feed(f.read())
+    parser.close()
+    return parser.links()
+
+
+class RequestMetrics:
+    """單一請求的計時與流量紀錄"""
+
+    __slots__ = ('started', 'wall_started', 'read_seconds', 'compress_seconds', 'bytes_in', 'bytes_out',
+                 'status', 'mime_type', 'encoding')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.read_seconds = 0.0
+        self.compress_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.status = None
+        self.mime_type = None
+        self.encoding = 'identity'
+
+
+class ServerMetrics:
+    """彙總請求指標，輸出 Prometheus 文字格式"""
+
+    DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}       # (mime_type, encoding, status) -> count
+        self._by_mime = {}        # mime_type -> [duration, read, compress, bytes_in, bytes_out]
+        self._compressed = {}     # mime_type -> [bytes_in, bytes_out]
+        self._buckets = [0] * len(self.DURATION_BUCKETS)
+        self._duration_count = 0
+        self._duration_sum = 0.0
+
+    def observe(self, request, duration):
+        mime_type = request.mime_type or 'unknown'
+        with self._lock:
+            key = (mime_type, request.encoding, str(request.status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            totals = self._by_mime.setdefault(mime_type, [0.0, 0.0, 0.0, 0, 0])
+            totals[0] += duration
+            totals[1] += request.read_seconds
+            totals[2] += request.compress_seconds
+            totals[3] += request.bytes_in
+            totals[4] += request.bytes_out
+            if request.encoding != 'identity' and request.bytes_in:
+                compressed = self._compressed.setdefault(mime_type, [0, 0])
+                compressed[0] += request.bytes_in
+                compressed[1] += request.bytes_out
+            for i, bound in enumerate(self.DURATION_BUCKETS):
+                if duration <= bound:
+                    self._buckets[i] += 1
+            self._duration_count += 1
+            self._duration_sum += duration
+
+    def render(self, caches=None):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        with self._lock:
+            metric('devserver_requests_total', 'counter', '請求數',
+                   [((('mime_type', m), ('encoding', e), ('status', s)), n)
+                    for (m, e, s), n in sorted(self._requests.items())])
+            metric('devserver_request_duration_seconds', 'histogram', '請求處理時間', [])
+            for bound, count in zip(self.DURATION_BUCKETS, self._buckets):
+                lines.append(f'devserver_request_duration_seconds_bucket{{le="{bound}"}} {count}')
+            lines.append(f'devserver_request_duration_seconds_bucket{{le="+Inf"}} {self._duration_count}')
+            lines.append(f'devserver_request_duration_seconds_sum {self._duration_sum}')
+            lines.append(f'devserver_request_duration_seconds_count {self._duration_count}')
+            by_mime = sorted(self._by_mime.items())
+            for index, name, help_text in (
+                (0, 'devserver_request_seconds_total', '依 MIME 類型累計的請求處理時間'),
+                (1, 'devserver_read_seconds_total', '讀取檔案耗時'),
+                (2, 'devserver_compress_seconds_total', '壓縮耗時'),
+                (3, 'devserver_source_bytes_total', '回應所對應的原始檔案位元組數'),
+                (4, 'devserver_response_bytes_total', '實際送出的內容位元組數'),
+            ):
+                metric(name, 'counter', help_text,
+                       [((('mime_type', m),), totals[index]) for m, totals in by_mime])
+            metric('devserver_compression_ratio', 'gauge', '壓縮後與原始大小比例（僅計壓縮回應）',
+                   [((('mime_type', m),), round(out / src, 4))
+                    for m, (src, out) in sorted(self._compressed.items())])
+        cache_stats = {name: cache.stats() for name, cache in (caches or {}).items()}
+        for key, name, kind, help_text in (
+            ('hits', 'devserver_cache_hits_total', 'counter', '快取命中次數'),
+            ('misses', 'devserver_cache_misses_total', 'counter', '快取未命中次數'),
+            ('evictions', 'devserver_cache_evictions_total', 'counter', '快取淘汰次數'),
+            ('bytes', 'devserver_cache_bytes', 'gauge', '快取佔用位元組'),
+        ):
+            metric(name, kind, help_text,
+                   [((('cache', cache_name),), stats[key]) for cache_name, stats in cache_stats.items()])
+        return '\n'.join(lines) + '\n'
+
 
 class GzipHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    compressed_cache = VersionedLRUCache()
+    etag_cache = VersionedLRUCache(max_entries=1024)
+    preload_cache = VersionedLRUCache(max_entries=64)
+    metrics = ServerMetrics()
+    stream_threshold = DEFAULT_STREAM_THRESHOLD
+    # 'text'：標準存取紀錄，'json'：每請求一行結構化紀錄，'off'：不輸出
+    access_log = 'text'
+    # 啟動時建立的 AssetIndex；為 None 時每個請求直接查詢檔案系統
+    asset_index = None
+    # ThrottleProfile；為 None 時不節流
+    throttle = None
+    # 未啟用索引時與非檔案回應（目錄列表、轉址）使用的快取規則；啟用索引時以索引的規則為準
+    cache_rules = DEFAULT_CACHE_RULES
+    # TraceRecorder；為 None 時不記錄請求追蹤
+    trace_recorder = None
+    # HTML 回應附帶 preload Link 標頭；early_hints 另外先送出 103 Early Hints
+    preload_hints = True
+    early_hints = False
+    response_status = None
+    cache_control_sent = False
+    request_metrics = None
+
+    def setup(self):
+        super().setup()
+        if self.throttle is not None and self.throttle.bandwidth_kbps:
+            self.wfile = ThrottledWriter(self.wfile, Pacer(self.throttle.bandwidth_kbps))
+
+    def parse_request(self):
+        ok = super().parse_request()
+        # asyncio 後端的延遲由連線協程以非阻塞方式注入
+        if ok and self.throttle is not None and self.throttle.latency_ms and hasattr(self, 'connection'):
+            time.sleep(self.throttle.latency_ms / 1000)
+        return ok
+
+    def log_message(self, format, *args):
+        if self.access_log != 'off':
+            super().log_message(format, *args)
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log == 'text':
+            super().log_request(code, size)
+
+    def send_response(self, code, message=None):
+        if self.request_metrics is not None:
+            self.request_metrics.status = code
+        self.response_status = code
+        self.cache_control_sent = False
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'cache-control':
+            self.cache_control_sent = True
+        request = self.request_metrics
+        if request is not None:
+            name = keyword.lower()
+            if name == 'content-type':
+                request.mime_type = value.split(';')[0].strip()
+            elif name == 'content-encoding':
+                request.encoding = value
+            elif name == 'content-length':
+                request.bytes_out = int(value)
+        super().send_header(keyword, value)
+
     def end_headers(self):
+        # 原始處理器的回應（目錄列表、轉址、錯誤頁）同樣套用快取規則
+        if not self.cache_control_sent and self.response_status is not None:
+            if self.response_status >= 400:
+                self.send_header('Cache-Control', ERROR_CACHE_CONTROL)
+            else:
+                url = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).lstrip('/')
+                rules = self.asset_index.cache_rules if self.asset_index is not None else self.cache_rules
+                cache_control = cache_policy(url, rules)
+                if cache_control:
+                    self.send_header('Cache-Control', cache_control)
+
         # 添加安全頭
         self.send_header('Content-Security-Policy', 
                         "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'; font-src 'self' data:; img-src 'self' data: blob:; connect-src 'self'; frame-ancestors 'none'; base-uri 'self';")
@@ -17,55 +854,825 @@ class GzipHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Strict-Transport-Security', 'max-age=31536000; includeSubDomains')
         super().end_headers()
 
+    def file_etag(self, entry):
+        # 以內容雜湊產生強 ETag，每個檔案版本只計算一次
+        etag = self.etag_cache.get(entry.path, entry.mtime_ns, entry.size)
+        if etag is None:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(entry.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b''):
+                    digest.update(chunk)
+            etag = f'"{digest.hexdigest()}"'
+            self.etag_cache.put(entry.path, entry.mtime_ns, entry.size, etag)
+        return etag
+
+    def is_not_modified(self, etag, entry):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, etag)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            return entry.mtime_ns // 10**9 <= since.timestamp()
+        return False
+
+    def send_not_modified(self, headers):
+        self.send_response(304)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def find_precompressed(self, entry, accepted):
+        """依用戶端接受度挑選最佳的預壓縮副檔"""
+        for sidecar in entry.sidecars:
+            if accepted.get(sidecar[0], accepted.get('*', 0)) > 0:
+                return sidecar
+        return None
+
+    def lookup_asset(self, url):
+        if self.asset_index is not None:
+            return self.asset_index.lookup(url)
+        # 未啟用索引時逐次查詢檔案系統；translate_path 負責限制在服務目錄內
+        return stat_asset(url, self.translate_path('/' + url), self.cache_rules)
+
+    def resolve_asset(self):
+        """將請求路徑對應到 AssetEntry，找不到一般檔案時回傳 None"""
+        url = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).lstrip('/')
+        if url == '' or url.endswith('/'):
+            url += 'index.html'
+        entry = self.lookup_asset(url)
+        if entry is not None:
+            return entry
+        # 內容雜湊網址：雜湊與目前內容相符時以 immutable 提供
+        match = FINGERPRINT_PATTERN.match(url)
+        if match:
+            entry = self.lookup_asset(match.group('stem') + (match.group('ext') or ''))
+            if entry is not None and fingerprint_url(entry.url, self.file_etag(entry)) == url:
+                return entry._replace(cache_control=IMMUTABLE_CACHE_CONTROL)
+        return None
+
+    def send_asset_manifest(self):
+        """列出可用的內容雜湊網址，供頁面或測試工具引用"""
+        index = self.asset_index or AssetIndex(self.directory, self.cache_rules)
+        manifest = {}
+        for url in sorted(index.urls()):
+            entry = index.lookup(url)
+            if entry is None or any(url.endswith(suffix) for _, suffix in PRECOMPRESSED_ENCODINGS):
+                continue
+            try:
+                manifest[url] = fingerprint_url(url, self.file_etag(entry))
+            except OSError:
+                continue
+        body = json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
     def do_GET(self):
-        # 檢查瀏覽器是否支援 gzip
-        accept_encoding = self.headers.get('Accept-Encoding', '')
-        
-        # 獲取要請求的文件路徑
-        if self.path == '/':
-            path = 'index.html'
-        else:
-            path = self.path.lstrip('/')
-        
-        # 確保文件存在
-        if not os.path.exists(path):
-            super().do_GET()
+        if self.path == METRICS_PATH:
+            self.send_metrics()
+            return
+        if self.path == ASSET_MANIFEST_PATH:
+            self.send_asset_manifest()
             return
+        self.request_metrics = RequestMetrics()
+        try:
+            self.handle_get()
+        finally:
+            self.finish_request_metrics()
+
+    def do_HEAD(self):
+        # 與 GET 走相同的表示法選擇，ETag、Content-Encoding 與 Content-Length 一致，只省略內容
+        self.do_GET()
+
+    def finish_request_metrics(self):
+        request = self.request_metrics
+        self.request_metrics = None
+        duration = time.perf_counter() - request.started
+        self.metrics.observe(request, duration)
+        if self.trace_recorder is not None:
+            self.trace_recorder.record(self, request, duration)
+        if self.access_log == 'json':
+            ratio = round(request.bytes_out / request.bytes_in, 4) if request.bytes_in else None
+            sys.stderr.write(json.dumps({
+                'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+                'client': self.address_string(),
+                'method': self.command,
+                'path': self.path,
+                'status': request.status,
+                'mime_type': request.mime_type,
+                'encoding': request.encoding,
+                'duration_ms': round(duration * 1000, 3),
+                'read_ms': round(request.read_seconds * 1000, 3),
+                'compress_ms': round(request.compress_seconds * 1000, 3),
+                'bytes_in': request.bytes_in,
+                'bytes_out': request.bytes_out,
+                'compression_ratio': ratio,
+            }, ensure_ascii=False) + '\n')
+
+    def send_metrics(self):
+        body = self.metrics.render({
+            'compressed': self.compressed_cache,
+            'etag': self.etag_cache,
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def handle_get(self):
+        # 解析瀏覽器支援的壓縮格式
+        accepted = parse_accept_encoding(self.headers.get('Accept-Encoding', ''))
         
+        # 查詢資源索引，非一般檔案（目錄列表、404 等）交給原始處理器
+        entry = self.resolve_asset()
+        if entry is None:
+            if self.command == 'HEAD':
+                super().do_HEAD()
+            else:
+                super().do_GET()
+            return
+        try:
+            self.send_asset(entry, accepted)
+        except FileNotFoundError:
+            # 索引尚未收到刪除事件
+            if self.asset_index is not None:
+                self.asset_index.refresh(entry.path)
+            self.send_error(404, 'File not found')
+
+    def preload_links(self, entry):
+        # 每個 HTML 版本只解析一次
+        links = self.preload_cache.get(entry.path, entry.mtime_ns, entry.size)
+        if links is None:
+            links = extract_preload_links(entry.path, entry.url)
+            self.preload_cache.put(entry.path, entry.mtime_ns, entry.size, links)
+        return links
+
+    def send_early_hints(self, links):
+        # 1xx 回應只能送給 HTTP/1.1 用戶端
+        if self.request_version != 'HTTP/1.1' or self.protocol_version != 'HTTP/1.1':
+            return
+        lines = ['HTTP/1.1 103 Early Hints'] + [f'Link: {link}' for link in links]
+        self.wfile.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'strict'))
+        self.wfile.flush()
+
+    def send_asset(self, entry, accepted):
+        links = ()
+        if self.preload_hints and entry.mime_type == 'text/html':
+            links = self.preload_links(entry)
+            if links and self.early_hints and self.command != 'HEAD':
+                self.send_early_hints(links)
+
         # 檢查是否應該壓縮
-        mime_type, _ = mimetypes.guess_type(path)
-        compressible_types = [
-            'text/html', 'text/css', 'text/javascript', 'application/javascript',
-            'text/plain', 'application/json', 'text/xml', 'application/xml'
-        ]
-        
+        mime_type = entry.mime_type
+        precompressed = self.find_precompressed(entry, accepted)
         should_compress = (
-            'gzip' in accept_encoding and 
-            mime_type in compressible_types and
-            os.path.getsize(path) > 1024  # 只壓縮大於1KB的文件
+            precompressed is None and entry.compressible and
+            accepted.get('gzip', accepted.get('*', 0)) > 0
         )
-        
-        if should_compress:
-            # 讀取文件並壓縮
-            with open(path, 'rb') as f:
-                content = f.read()
-            
-            compressed_content = gzip.compress(content)
+        cache_control = entry.cache_control
+
+        # 每種表示法（raw、即時 gzip、各預壓縮副檔）各自擁有強 ETag
+        etag = self.file_etag(entry)
+        if precompressed:
+            etag = etag[:-1] + '-' + precompressed[1].lstrip('.') + '"'
+        elif should_compress:
+            etag = etag[:-1] + '-gzip"'
+        validators = [
+            ('ETag', etag),
+            ('Last-Modified', entry.last_modified),
+        ]
+        if entry.compressible or entry.sidecars:
+            validators.append(('Vary', 'Accept-Encoding'))
+        if links:
+            validators.append(('Link', ', '.join(links)))
+        # 規則檔可能沒有涵蓋所有路徑，無符合規則時不送出 Cache-Control
+        if cache_control:
+            validators.append(('Cache-Control', cache_control))
+
+        if self.is_not_modified(etag, entry):
+            self.send_not_modified(validators)
+            return
+        self.request_metrics.bytes_in = entry.size
+
+        if precompressed:
+            # 直接串流預壓縮副檔，無執行期壓縮成本
+            encoding, suffix, sidecar_size = precompressed
+            with open(entry.path + suffix, 'rb') as f:
+                self.send_response(200)
+                self.send_header('Content-Type', mime_type)
+                self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(sidecar_size))
+                for name, value in validators:
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.send_file_body(f, 0, sidecar_size)
+        elif should_compress and entry.size > self.stream_threshold:
+            # 大檔案逐塊壓縮並以 chunked 傳送，記憶體用量固定
+            with open(entry.path, 'rb') as f:
+                self.send_response(200)
+                self.send_header('Content-Type', mime_type)
+                self.send_header('Content-Encoding', 'gzip')
+                for name, value in validators:
+                    self.send_header(name, value)
+                self.send_compressed_stream(f)
+        elif should_compress:
+            # 優先使用快取，檔案變更時才重新壓縮
+            compressed_content = self.compressed_cache.get(entry.path, entry.mtime_ns, entry.size)
+            if compressed_content is None:
+                started = time.perf_counter()
+                with open(entry.path, 'rb') as f:
+                    content = f.read()
+                read_done = time.perf_counter()
+                # 固定 gzip 標頭（mtime=0）讓壓縮結果可重現，且與串流模式輸出相同，ETag 才能維持強驗證
+                # zlib.compress 的 wbits 參數需 Python 3.11 以上，改用與串流模式相同的 compressobj
+                compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+                compressed_content = compressor.compress(content) + compressor.flush()
+                self.request_metrics.read_seconds += read_done - started
+                self.request_metrics.compress_seconds += time.perf_counter() - read_done
+                self.compressed_cache.put(entry.path, entry.mtime_ns, entry.size, compressed_content)
             
             self.send_response(200)
             self.send_header('Content-Type', mime_type)
             self.send_header('Content-Encoding', 'gzip')
             self.send_header('Content-Length', str(len(compressed_content)))
-            self.send_header('Cache-Control', 'public, max-age=31536000' if path.startswith('fonts/') or path.startswith('images/') else 'public, max-age=3600')
+            for name, value in validators:
+                self.send_header(name, value)
             self.end_headers()
-            self.wfile.write(compressed_content)
+            if self.command != 'HEAD':
+                self.wfile.write(compressed_content)
         else:
-            # 使用原始處理器
-            super().do_GET()
+            # 未壓縮內容走零複製路徑，並支援 Range
+            self.send_static_file(entry, validators)
+
+    def send_compressed_stream(self, f):
+        """結束標頭並以 zlib 增量壓縮串流檔案內容"""
+        chunked = self.request_version == 'HTTP/1.1' and self.protocol_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            # HTTP/1.0 無 chunked，以關閉連線標示內容結束
+            self.close_connection = True
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        request = self.request_metrics
+
+        def write(data):
+            if not data:
+                return
+            request.bytes_out += len(data)
+            if chunked:
+                self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+        while True:
+            started = time.perf_counter()
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            read_done = time.perf_counter()
+            request.read_seconds += read_done - started
+            if not chunk:
+                break
+            compressed = compressor.compress(chunk)
+            request.compress_seconds += time.perf_counter() - read_done
+            write(compressed)
+        write(compressor.flush())
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def parse_range(self, size, etag, entry):
+        """解析單一 bytes Range，回傳 (start, end)；不適用時回傳 None，無法滿足時回傳 False"""
+        range_header = self.headers.get('Range')
+        if not range_header or not range_header.startswith('bytes='):
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range:
+            # If-Range 不符時忽略 Range，回傳完整內容
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                if if_range.strip() != etag:
+                    return None
+            elif if_range.strip() != entry.last_modified:
+                return None
+        spec = range_header[len('bytes='):].strip()
+        if ',' in spec:
+            # 不支援多段範圍，依規範可直接回傳完整內容
+            return None
+        first, sep, last = spec.partition('-')
+        try:
+            if not sep:
+                return None
+            if first == '':
+                suffix = int(last)
+                if suffix <= 0:
+                    return False
+                return max(size - suffix, 0), size - 1
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size or end < start:
+            return False
+        return start, min(end, size - 1)
+
+    def send_static_file(self, entry, validators):
+        size = entry.size
+        etag = dict(validators)['ETag']
+        byte_range = self.parse_range(size, etag, entry)
+        if byte_range is False:
+            self.request_metrics.bytes_in = 0
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        with open(entry.path, 'rb') as f:
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            else:
+                start, end = 0, size - 1
+                self.send_response(200)
+            length = end - start + 1
+            self.request_metrics.bytes_in = length
+            self.send_header('Content-Type', entry.mime_type)
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            for name, value in validators:
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.send_file_body(f, start, length)
+
+    def send_file_body(self, f, offset, length):
+        if length <= 0:
+            return
+        # 優先以 sendfile 由核心直接傳送（asyncio 後端經由事件迴圈的 loop.sendfile）；需節流時改用 mmap
+        connection = getattr(self, 'connection', None)
+        if isinstance(connection, socket.socket) and not isinstance(self.wfile, ThrottledWriter):
+            connection.sendfile(f, offset, length)
+            return
+        if isinstance(self.wfile, TransportWriter) and self.wfile.sendfile(f, offset, length):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            self.wfile.write(view[offset:offset + length])
+
+
+class ReusableTCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, sock=None, reuse_port=False):
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class, bind_and_activate=sock is None)
+        if sock is not None:
+            # 沿用父行程已監聽的 socket（prefork 共用模式）
+            self.socket.close()
+            self.socket = sock
+            self.server_address = sock.getsockname()[:2]
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def handle_error(self, request, client_address):
+        # 用戶端中途斷線在壓力測試中很常見，不輸出堆疊
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class BoundedThreadingTCPServer(ReusableTCPServer):
+    """以固定大小執行緒池處理連線的 TCP 伺服器"""
+
+    def __init__(self, server_address, handler_class, max_workers=DEFAULT_MAX_WORKERS,
+                 sock=None, reuse_port=False):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http-worker')
+        super().__init__(server_address, handler_class, sock=sock, reuse_port=reuse_port)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+
+class _WorkerRequestServer:
+    """提供給 asyncio 後端中處理器使用的最小 server 物件"""
+
+    def __init__(self, server_address):
+        self.server_address = server_address
+
+
+class TransportWriter:
+    """asyncio 後端處理器的 wfile：工作執行緒把資料交給事件迴圈寫入連線並等待 drain 後才返回，
+    回應邊產生邊送出（103 Early Hints、chunked 串流），記憶體用量受傳輸層緩衝上限限制"""
+
+    # 每次交給事件迴圈的最大位元組數；傳輸層可能保留緩衝區參照，大塊資料分段複製
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, loop, writer, pacer=None):
+        self._loop = loop
+        self._writer = writer
+        self._pacer = pacer
+        self.closed = False
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _send(self, data):
+        if self._pacer is None:
+            self._writer.write(data)
+            await self._writer.drain()
+            return
+        view = memoryview(data)
+        for offset in range(0, len(view), self._pacer.chunk_size):
+            piece = view[offset:offset + self._pacer.chunk_size]
+            delay = self._pacer.reserve(len(piece))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._writer.write(piece)
+            await self._writer.drain()
+
+    def write(self, data):
+        view = memoryview(data).cast('B')
+        for offset in range(0, len(view), self.CHUNK_SIZE):
+            # 複製為 bytes：呼叫端（例如 mmap）可能在返回後釋放緩衝區
+            self._call(self._send(bytes(view[offset:offset + self.CHUNK_SIZE])))
+        return len(view)
+
+    def sendfile(self, f, offset, length):
+        """以 loop.sendfile 傳送檔案區段，平台支援時由核心直接傳送"""
+        if self._pacer is not None:
+            return False
+        self._call(self._loop.sendfile(self._writer.transport, f, offset, length))
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _run_request(handler_class, raw_request, client_address, server, wfile):
+    # 在工作執行緒中執行單一請求，回應經由 wfile 直接寫入連線；回傳是否關閉連線
+    handler = handler_class.__new__(handler_class)
+    handler.request = None
+    handler.client_address = client_address
+    handler.server = server
+    handler.directory = os.getcwd()
+    handler.rfile = io.BytesIO(raw_request)
+    handler.wfile = wfile
+    handler.close_connection = True
+    try:
+        handler.handle_one_request()
+    finally:
+        handler.rfile.close()
+    return handler.close_connection
+
+
+def _content_length(head):
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            try:
+                return max(int(value.strip()), 0)
+            except ValueError:
+                return 0
+    return 0
+
+
+class AsyncioHTTPServer:
+    """asyncio 後端：非同步收發連線資料，處理器在有限執行緒池中執行"""
+
+    def __init__(self, server_address, handler_class, max_workers=DEFAULT_MAX_WORKERS,
+                 keep_alive_timeout=KEEP_ALIVE_TIMEOUT, sock=None, reuse_port=False):
+        self.handler_class = handler_class
+        self.keep_alive_timeout = keep_alive_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http-worker')
+        self._socket = sock or socket.create_server(server_address, reuse_port=reuse_port)
+        self.server_address = self._socket.getsockname()[:2]
+        self._loop = None
+        self._stopped = None
+        self._clients = {}
+        self._finished = threading.Event()
+
+    async def _handle_client(self, reader, writer):
+        self._clients[asyncio.current_task()] = writer
+        client_address = writer.get_extra_info('peername')[:2]
+        # 與執行緒後端的 disable_nagle_algorithm 相同：標頭與內容分次寫入，
+        # keep-alive 下需關閉 Nagle 以免與延遲 ACK 互相等待（create_server 的 socket proto 為 0，
+        # asyncio 不會自動設定 TCP_NODELAY）
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        server = _WorkerRequestServer(self.server_address)
+        loop = asyncio.get_running_loop()
+        throttle = self.handler_class.throttle
+        pacer = Pacer(throttle.bandwidth_kbps) if throttle and throttle.bandwidth_kbps else None
+        wfile = TransportWriter(loop, writer, pacer)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keep_alive_timeout)
+                    length = _content_length(head)
+                    body = await reader.readexactly(length) if length else b''
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+                if throttle is not None and throttle.latency_ms:
+                    await asyncio.sleep(throttle.latency_ms / 1000)
+                close = await loop.run_in_executor(
+                    self._executor, _run_request,
+                    self.handler_class, head + body, client_address, server, wfile)
+                if close:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_server(self._handle_client, sock=self._socket)
+        async with server:
+            await self._stopped.wait()
+            # 關閉仍保持 keep-alive 的連線，讓各連線協程自行結束
+            tasks = list(self._clients)
+            for writer in self._clients.values():
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def serve_forever(self):
+        self._finished.clear()
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._finished.set()
+
+    def shutdown(self):
+        # 與 socketserver 相同：阻塞直到 serve_forever 結束
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+            self._finished.wait()
+
+    def server_close(self):
+        self._socket.close()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+
+def build_handler(keep_alive, **options):
+    # 並行後端啟用 HTTP/1.1 keep-alive，單執行緒模式維持 HTTP/1.0 避免單一連線佔住伺服器
+    # options 會成為處理器的類別屬性（例如 stream_threshold）
+    attrs = dict(options)
+    if keep_alive:
+        # 標頭與內容分開送出，keep-alive 下需關閉 Nagle 以免與延遲 ACK 互相等待
+        attrs.update(protocol_version='HTTP/1.1', timeout=KEEP_ALIVE_TIMEOUT,
+                     disable_nagle_algorithm=True)
+    if not attrs:
+        return GzipHTTPRequestHandler
+    name = 'KeepAliveGzipHTTPRequestHandler' if keep_alive else 'GzipHTTPRequestHandler'
+    return type(name, (GzipHTTPRequestHandler,), attrs)
+
+
+def create_server(backend, host='', port=PORT, max_workers=DEFAULT_MAX_WORKERS,
+                  sock=None, reuse_port=False, **handler_options):
+    # sock：沿用已監聽的 socket；reuse_port：以 SO_REUSEPORT 綁定（皆供 prefork 使用）
+    if backend == 'single':
+        return ReusableTCPServer((host, port), build_handler(False, **handler_options),
+                                 sock=sock, reuse_port=reuse_port)
+    if backend == 'threaded':
+        return BoundedThreadingTCPServer((host, port), build_handler(True, **handler_options),
+                                         max_workers, sock=sock, reuse_port=reuse_port)
+    if backend == 'asyncio':
+        return AsyncioHTTPServer((host, port), build_handler(True, **handler_options),
+                                 max_workers, sock=sock, reuse_port=reuse_port)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+class PreforkSupervisor:
+    """以 fork 啟動多個工作行程並在異常結束時重啟，讓壓縮工作可使用多核心
+
+    reuse_port 為 True 且平台支援 SO_REUSEPORT 時，每個工作行程各自綁定同一連接埠，
+    由核心分配連線；否則由父行程建立監聽 socket 供所有工作行程共用。
+    """
+
+    RESTART_BACKOFF = 1.0
+
+    def __init__(self, backend, host, port, workers, max_workers=DEFAULT_MAX_WORKERS,
+                 reuse_port=True, worker_options=None):
+        if not hasattr(os, 'fork'):
+            raise OSError(errno.ENOSYS, 'prefork 模式需要 os.fork')
+        self.backend = backend
+        self.workers = workers
+        self.max_workers = max_workers
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        # 每個工作行程 fork 後呼叫，回傳處理器選項（如需在子行程啟動的 AssetIndex 監看）
+        self.worker_options = worker_options or dict
+        self._children = {}
+        self._stopping = False
+        # reuse_port 模式下父行程的 socket 只綁定不監聽，用來保留連接埠（含 port=0 時決定實際埠號）
+        self._socket = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self._socket.bind((host, port))
+        if not self.reuse_port:
+            self._socket.listen(socketserver.TCPServer.request_queue_size * workers)
+        self.server_address = self._socket.getsockname()[:2]
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid:
+            self._children[pid] = (slot, time.monotonic())
+            return
+        # 子行程
+        code = 0
+        try:
+            self._run_worker()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _run_worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if self.reuse_port:
+            self._socket.close()
+            httpd = create_server(self.backend, *self.server_address, self.max_workers,
+                                  reuse_port=True, **self.worker_options())
+        else:
+            httpd = create_server(self.backend, *self.server_address, self.max_workers,
+                                  sock=self._socket, **self.worker_options())
+        # shutdown 會等待 serve_forever 結束，必須在其他執行緒呼叫
+        signal.signal(signal.SIGTERM,
+                      lambda *_: threading.Thread(target=httpd.shutdown, daemon=True).start())
+        with httpd:
+            httpd.serve_forever()
+
+    def serve_forever(self):
+        for slot in range(self.workers):
+            self._spawn(slot)
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        try:
+            while self._children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except KeyboardInterrupt:
+                    self.stop()
+                    continue
+                slot, started = self._children.pop(pid, (None, 0))
+                if self._stopping or slot is None:
+                    continue
+                print(f"⚠️  工作行程 {pid} 結束（{self._describe_status(status)}），重新啟動")
+                if time.monotonic() - started < self.RESTART_BACKOFF:
+                    # 啟動後立即崩潰時稍作等待，避免不斷 fork
+                    time.sleep(self.RESTART_BACKOFF)
+                if not self._stopping:
+                    self._spawn(slot)
+        finally:
+            self._socket.close()
+
+    @staticmethod
+    def _describe_status(status):
+        if os.WIFSIGNALED(status):
+            return f'signal {os.WTERMSIG(status)}'
+        return f'exit {os.WEXITSTATUS(status)}'
+
+    def stop(self):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Click Fun 開發伺服器（gzip 壓縮）')
+    parser.add_argument('--host', default='', help='綁定位址（預設所有介面）')
+    parser.add_argument('--port', type=int, default=PORT, help=f'連接埠（預設 {PORT}）')
+    parser.add_argument('--backend', choices=BACKENDS, default='single',
+                        help='並行模式：single、threaded（有限執行緒池）或 asyncio')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='prefork 工作行程數（>1 時啟用，每個行程各自執行所選後端）')
+    parser.add_argument('--no-reuse-port', action='store_true',
+                        help='prefork 時改由父行程建立監聽 socket 共用，而非 SO_REUSEPORT')
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'threaded/asyncio 後端的工作執行緒數（預設 {DEFAULT_MAX_WORKERS}）')
+    parser.add_argument('--stream-threshold', type=int, default=DEFAULT_STREAM_THRESHOLD,
+                        help=f'超過此位元組數的檔案以串流壓縮傳送（預設 {DEFAULT_STREAM_THRESHOLD}）')
+    parser.add_argument('--watch', choices=('auto', 'inotify', 'poll', 'off'), default='auto',
+                        help='資源索引更新方式：auto（inotify，失敗時輪詢）、inotify、poll 或 off（每請求查詢檔案系統）')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f'輪詢監看間隔秒數（預設 {DEFAULT_POLL_INTERVAL}）')
+    parser.add_argument('--cache-rules', metavar='FILE',
+                        help='Cache-Control 規則 JSON 檔（glob → max_age/immutable/stale_while_revalidate/no_cache）')
+    parser.add_argument('--no-preload', action='store_true',
+                        help='不在 HTML 回應加上由頁面擷取的 preload Link 標頭')
+    parser.add_argument('--early-hints', action='store_true',
+                        help='在 HTML 回應前先送出 103 Early Hints（需 HTTP/1.1 並行後端）')
+    parser.add_argument('--throttle', choices=sorted(THROTTLE_PROFILES) + ['custom'],
+                        help='網路節流設定檔（slow-3g、fast-3g、4g 或 custom）')
+    parser.add_argument('--latency-ms', type=float, help='覆寫節流延遲（每個請求，毫秒）')
+    parser.add_argument('--bandwidth-kbps', type=float, help='覆寫每條連線的下行頻寬（kbit/s）')
+    parser.add_argument('--record-trace', metavar='FILE',
+                        help='將請求序列與計時附加寫入 JSON Lines 追蹤檔，供 trace_replay.py 重播')
+    parser.add_argument('--trace-label', help='追蹤檔標籤，例如 cold-sw 或 warm-sw')
+    parser.add_argument('--access-log', choices=('text', 'json', 'off'), default='text',
+                        help='存取紀錄格式：text（預設）、json（結構化，含計時與壓縮比）或 off')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    throttle = make_throttle(args.throttle, args.latency_ms, args.bandwidth_kbps)
+    if throttle is not None:
+        print(f"Throttling: {throttle.name} ({throttle.latency_ms} ms, {throttle.bandwidth_kbps or '∞'} kbit/s)")
+    cache_rules = load_cache_rules(args.cache_rules) if args.cache_rules else DEFAULT_CACHE_RULES
+    handler_options = {
+        'cache_rules': cache_rules,
+        'stream_threshold': args.stream_threshold,
+        'access_log': args.access_log,
+        'preload_hints': not args.no_preload,
+        'early_hints': args.early_hints and not args.no_preload,
+        'throttle': throttle,
+    }
+    if args.record_trace:
+        handler_options['trace_recorder'] = TraceRecorder(args.record_trace, args.trace_label)
+        print(f"Recording request trace to {args.record_trace}")
+
+    if args.processes > 1:
+        # 監看執行緒無法跨越 fork，索引在每個工作行程中各自建立
+        def worker_options():
+            options = dict(handler_options)
+            if args.watch != 'off':
+                options['asset_index'] = AssetIndex(os.getcwd(), cache_rules).watch(args.watch, args.poll_interval)
+            return options
+
+        supervisor = PreforkSupervisor(args.backend, args.host, args.port, args.processes,
+                                       args.max_workers, reuse_port=not args.no_reuse_port,
+                                       worker_options=worker_options)
+        mode = 'SO_REUSEPORT' if supervisor.reuse_port else 'shared socket'
+        print(f"Starting server on port {supervisor.server_address[1]} with gzip compression "
+              f"({args.processes} x {args.backend} backend, {mode})...")
+        supervisor.serve_forever()
+        return
+
+    asset_index = None
+    if args.watch != 'off':
+        asset_index = AssetIndex(os.getcwd(), cache_rules).watch(args.watch, args.poll_interval)
+        print(f"Indexed {len(asset_index)} assets")
+    try:
+        with create_server(args.backend, args.host, args.port, args.max_workers,
+                           asset_index=asset_index, **handler_options) as httpd:
+            print(f"Starting server on port {httpd.server_address[1]} with gzip compression ({args.backend} backend)...")
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        if asset_index is not None:
+            asset_index.close()
 
-PORT = 5500
-Handler = GzipHTTPRequestHandler
 
-print(f"Starting server on port {PORT} with gzip compression...")
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    httpd.serve_forever()
+if __name__ == '__main__':
+    main()
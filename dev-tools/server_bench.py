@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+開發伺服器壓力測試工具
+
+在子行程中以臨時連接埠啟動 GzipHTTPRequestHandler，
+由 N 個 keep-alive 用戶端依設定的資源比例發送請求，
+分別量測 gzip 與 identity 協商下的 RPS、延遲百分位、傳輸量與每請求伺服器 CPU，
+結果以 JSON 輸出，方便比對壓縮與快取路徑的效能回歸。
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+
+import server
+
+DEFAULT_ASSETS = (
+    'index.html:2',
+    'app.js:3',
+    'styles.css:3',
+    'sw.js:1',
+    'fx.worker.js:1',
+    'fonts/FredokaOne-400.woff2:1',
+    'icons/icon-192x192.png:1',
+)
+ENCODINGS = {
+    # 只宣告 gzip：若同時接受 br，存在 .br 副檔時量測到的會是 brotli
+    'gzip': 'gzip',
+    'identity': 'identity',
+}
+
+
+def parse_asset(spec):
+    path, _, weight = spec.rpartition(':')
+    if not path or not weight.isdigit():
+        return spec, 1
+    return path, int(weight)
+
+
+def percentile(sorted_values, pct):
+    # 最近序位法
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _server_process(conn, root, backend, max_workers, handler_options):
+    os.chdir(root)
+    # 壓測期間資源不變，建立索引但不啟動監看
+    handler_options = dict(handler_options, asset_index=server.AssetIndex(root))
+    httpd = server.create_server(backend, '127.0.0.1', 0, max_workers, **handler_options)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    conn.send(httpd.server_address[1])
+    while True:
+        command = conn.recv()
+        if command == 'cpu':
+            # 子行程內所有執行緒的 CPU 時間，只計入伺服器本身
+            conn.send(time.process_time())
+        elif command == 'stop':
+            httpd.shutdown()
+            httpd.server_close()
+            conn.send(None)
+            return
+
+
+def _client_worker(port, assets, weights, accept_encoding, deadline, seed, results):
+    rng = random.Random(seed)
+    latencies = []
+    received = 0
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while time.perf_counter() < deadline:
+        path = rng.choices(assets, weights)[0]
+        started = time.perf_counter()
+        try:
+            conn.request('GET', '/' + path, headers={'Accept-Encoding': accept_encoding})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+        received += len(body)
+        if response.status >= 400:
+            errors += 1
+        if response.will_close:
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.close()
+    results.append((latencies, received, errors))
+
+
+def run_phase(port, control, assets, weights, accept_encoding, concurrency, duration, seed=0):
+    """以 concurrency 個用戶端執行 duration 秒，回傳統計結果"""
+    results = []
+    control.send('cpu')
+    cpu_before = control.recv()
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=_client_worker,
+                         args=(port, assets, weights, accept_encoding, deadline, seed + i, results))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    control.send('cpu')
+    cpu_used = control.recv() - cpu_before
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    received = sum(result[1] for result in results)
+    errors = sum(result[2] for result in results)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3) if count else 0.0,
+        },
+        'bytes': received,
+        'bytes_per_s': round(received / elapsed, 1) if elapsed else 0.0,
+        'server_cpu_s': round(cpu_used, 4),
+        'server_cpu_ms_per_request': round(cpu_used / count * 1000, 4) if count else 0.0,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Click Fun 開發伺服器壓力測試')
+    parser.add_argument('--root', default='.', help='靜態資源根目錄（預設目前目錄）')
+    parser.add_argument('--backend', choices=server.BACKENDS, default='threaded')
+    parser.add_argument('--max-workers', type=int, default=server.DEFAULT_MAX_WORKERS)
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='同時連線的用戶端數')
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help='每個階段的秒數')
+    parser.add_argument('--warmup', type=float, default=1.0, help='正式量測前的暖身秒數')
+    parser.add_argument('--asset', action='append', dest='assets', metavar='PATH[:WEIGHT]',
+                        help='資源與權重，可重複指定（預設為 App Shell 組合）')
+    parser.add_argument('--encoding', action='append', dest='encodings', choices=sorted(ENCODINGS),
+                        help='要量測的協商模式，可重複指定（預設 gzip 與 identity）')
+    parser.add_argument('--output', help='將 JSON 結果寫入檔案（預設輸出至 stdout）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = os.path.abspath(args.root)
+    assets, weights = zip(*(parse_asset(spec) for spec in (args.assets or DEFAULT_ASSETS)))
+    missing = [path for path in assets if not os.path.isfile(os.path.join(root, path))]
+    if missing:
+        print(f"❌ 找不到資源: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    control, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_server_process,
+        args=(child_conn, root, args.backend, args.max_workers, {'access_log': 'off'}),
+        daemon=True,
+    )
+    process.start()
+    port = control.recv()
+
+    report = {
+        'backend': args.backend,
+        'max_workers': args.max_workers,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'assets': dict(zip(assets, weights)),
+        'results': {},
+    }
+    try:
+        for name in args.encodings or list(ENCODINGS):
+            if args.warmup > 0:
+                run_phase(port, control, assets, weights, ENCODINGS[name], args.concurrency, args.warmup)
+            report['results'][name] = run_phase(
+                port, control, assets, weights, ENCODINGS[name], args.concurrency, args.duration)
+    finally:
+        control.send('stop')
+        control.recv()
+        process.join(timeout=5)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+開發伺服器請求追蹤重播工具
+
+讀取 server.py --record-trace 錄下的 JSON Lines 追蹤檔（例如冷／熱 Service Worker 的瀏覽過程），
+依原始時間間隔或加速倍率，對任一後端重新發送相同的請求序列與請求標頭，
+同一條連線的請求沿用同一條 keep-alive 連線，結果以 JSON 輸出延遲分佈；
+--compare 可比對兩次重播結果的延遲差異，用來評估快取與壓縮調整的實際效果。
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+import server
+from server_bench import _server_process, percentile
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+def load_trace(path):
+    """讀取追蹤檔，回傳 (標籤, 依時間排序的請求紀錄)"""
+    label = None
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f'{path}:{line_number}: 無法解析的追蹤紀錄') from None
+            if 'trace' in record:
+                # 多次錄製附加在同一檔案時保留第一個標籤
+                label = label or record.get('label')
+                continue
+            records.append(record)
+    records.sort(key=lambda record: record['t'])
+    return label or os.path.splitext(os.path.basename(path))[0], records
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    summary = {'count': count, 'mean': round(sum(latencies) / count * 1000, 3) if count else 0.0}
+    for pct in LATENCY_PERCENTILES:
+        summary[f'p{pct}'] = round(percentile(latencies, pct) * 1000, 3)
+    summary['max'] = round(latencies[-1] * 1000, 3) if count else 0.0
+    return summary
+
+
+def _replay_connection(host, port, requests, started, speed, results):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for record in requests:
+        if speed:
+            delay = started + record['t'] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        issued = time.perf_counter()
+        lag = issued - started - (record['t'] / speed if speed else 0.0)
+        try:
+            conn.request(record.get('method', 'GET'), record['path'], headers=record.get('headers', {}))
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            results.append({'path': record['path'], 'error': type(e).__name__})
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        results.append({
+            'path': record['path'],
+            'status': response.status,
+            'expected_status': record.get('status'),
+            'latency': time.perf_counter() - issued,
+            'lag': lag,
+            'bytes': len(body),
+        })
+        if response.will_close:
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.close()
+
+
+def replay(records, host, port, speed=1.0):
+    """重播一份追蹤，speed 為加速倍率，0 表示不等待、依序盡速送出"""
+    connections = OrderedDict()
+    for record in records:
+        connections.setdefault(record.get('conn'), []).append(record)
+    results = []
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=_replay_connection, args=(host, port, requests, started, speed, results))
+        for requests in connections.values()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    by_status = {}
+    for result in results:
+        if 'error' not in result:
+            by_status.setdefault(str(result['status']), []).append(result['latency'])
+    lags = sorted(result['lag'] for result in results if 'lag' in result)
+    return {
+        'requests': len(records),
+        'connections': len(connections),
+        'errors': sum(1 for result in results if 'error' in result or result['status'] >= 400),
+        # 狀態碼與錄製時不同，通常代表快取驗證或資源內容已改變
+        'status_mismatches': sum(1 for result in results
+                                 if result.get('expected_status') not in (None, result.get('status'))),
+        'elapsed_s': round(elapsed, 3),
+        'bytes': sum(result.get('bytes', 0) for result in results),
+        'latency_ms': latency_summary([result['latency'] for result in results if 'latency' in result]),
+        'latency_ms_by_status': {status: latency_summary(values) for status, values in sorted(by_status.items())},
+        # 實際送出時間落後排程的程度；數值偏大表示重播端本身跟不上
+        'schedule_lag_ms_p95': round(percentile(lags, 95) * 1000, 3),
+    }
+
+
+def compare_reports(baseline, candidate):
+    """比對兩份重播報告中同名後端與追蹤的延遲百分位，回傳差值（毫秒與百分比）"""
+    comparison = {}
+    for backend, traces in candidate['results'].items():
+        for label, result in traces.items():
+            base = baseline['results'].get(backend, {}).get(label)
+            if base is None:
+                continue
+            deltas = {}
+            for key, value in result['latency_ms'].items():
+                if key == 'count':
+                    continue
+                before = base['latency_ms'][key]
+                deltas[key] = {
+                    'baseline': before,
+                    'candidate': value,
+                    'delta_ms': round(value - before, 3),
+                    'delta_pct': round((value - before) / before * 100, 1) if before else None,
+                }
+            comparison.setdefault(backend, {})[label] = deltas
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Click Fun 開發伺服器請求追蹤重播')
+    parser.add_argument('traces', nargs='*', metavar='TRACE', help='server.py --record-trace 錄下的追蹤檔')
+    parser.add_argument('--root', default='.', help='靜態資源根目錄（預設目前目錄）')
+    parser.add_argument('--backend', action='append', dest='backends', choices=server.BACKENDS,
+                        help='在子行程啟動的後端，可重複指定（預設 threaded）')
+    parser.add_argument('--max-workers', type=int, default=server.DEFAULT_MAX_WORKERS)
+    parser.add_argument('--url', help='改為重播到已在執行的伺服器，例如 http://127.0.0.1:5500')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='時間軸加速倍率（預設 1 為原始速度，0 為不等待）')
+    parser.add_argument('--repeat', type=int, default=1, help='每份追蹤重播的次數，第一次之後的結果反映熱快取')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                        help='比對兩份重播報告的延遲分佈，不執行重播')
+    parser.add_argument('--output', help='將 JSON 結果寫入檔案（預設輸出至 stdout）')
+    return parser.parse_args(argv)
+
+
+def _emit(report, output):
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path, 'r', encoding='utf-8') as f:
+                reports.append(json.load(f))
+        _emit(compare_reports(*reports), args.output)
+        return 0
+    if not args.traces:
+        print('❌ 請指定至少一份追蹤檔或使用 --compare', file=sys.stderr)
+        return 1
+    if args.speed < 0:
+        print('❌ --speed 不可為負數', file=sys.stderr)
+        return 1
+
+    traces = [load_trace(path) for path in args.traces]
+    report = {'speed': args.speed, 'repeat': args.repeat,
+              'traces': {label: len(records) for label, records in traces}, 'results': {}}
+
+    def run_traces(host, port):
+        results = {}
+        for label, records in traces:
+            for iteration in range(args.repeat):
+                key = label if args.repeat == 1 else f'{label}#{iteration + 1}'
+                results[key] = replay(records, host, port, args.speed)
+        return results
+
+    if args.url:
+        target = urllib.parse.urlsplit(args.url)
+        report['results'][target.netloc] = run_traces(target.hostname, target.port or 80)
+        _emit(report, args.output)
+        return 0
+
+    root = os.path.abspath(args.root)
+    for backend in args.backends or ['threaded']:
+        control, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_server_process,
+            args=(child_conn, root, backend, args.max_workers, {'access_log': 'off'}),
+            daemon=True,
+        )
+        process.start()
+        port = control.recv()
+        try:
+            report['results'][backend] = run_traces('127.0.0.1', port)
+        finally:
+            control.send('stop')
+            control.recv()
+            process.join(timeout=5)
+
+    _emit(report, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
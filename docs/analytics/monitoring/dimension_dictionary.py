@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+維度字典 - 關鍵字、頁面、裝置與國家的整數編碼
+
+SEO 指標的 keywords / pages / devices / countries 每列、每次收集都重複相同的字串，
+這個模組把維度值對應到穩定的 int32 編號並保存為 JSON 檔：編號只增不改，
+收集器寫入的數據與讀取端都以同一份字典互相轉換編號與原始字串。
+多個行程共用字典檔時，新編號只在持有檔案鎖的交易內配發（見 transaction()）。
+只依賴標準函式庫，讀取端不需安裝 pyarrow。
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    from .file_lock import file_lock
+except ImportError:
+    # 直接執行 monitoring 內的腳本時沒有套件上下文
+    from file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+# 維度種類；SEOMetrics 欄位名稱 -> 維度種類
+DIMENSION_KINDS = ('keyword', 'page', 'device', 'country')
+DIMENSION_FIELDS = {'keywords': 'keyword', 'pages': 'page', 'devices': 'device', 'countries': 'country'}
+
+INT32_MAX = 2 ** 31 - 1
+
+
+class DimensionDictionary:
+    """維度值與 int32 編號的雙向對照；path 為 None 時只保存在記憶體
+
+    檔案格式為 {維度種類: [值, ...]}，值在清單中的索引即為編號，
+    因此只附加新值即可維持既有編號不變。有 path 時新編號只在 transaction() 內配發，
+    transaction() 之外呼叫 encode() 遇到新值會自行開啟一次交易。
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        self.path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+        # 交易同一時間只由一個執行緒持有；_transaction_owner 讓同一執行緒的巢狀呼叫不重複取鎖
+        self._transaction_lock = threading.RLock()
+        self._transaction_owner: Optional[int] = None
+        self._values: Dict[str, List[str]] = {kind: [] for kind in DIMENSION_KINDS}
+        self._codes: Dict[str, Dict[str, int]] = {kind: {} for kind in DIMENSION_KINDS}
+        self._dirty = False
+        self._signature: Optional[tuple] = None
+        self.reload()
+
+    def reload(self) -> bool:
+        """檔案在其他行程更新後重新載入；回傳是否有重新載入"""
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            stat = self.path.stat()
+            # 字典檔以 os.replace 整檔替換，inode、修改時間或大小改變即為新版本
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return False
+            with open(self.path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"載入維度字典失敗: {str(e)}")
+            return False
+        with self._lock:
+            for kind in DIMENSION_KINDS:
+                values = payload.get(kind, [])
+                current = self._values[kind]
+                common = min(len(values), len(current))
+                if values[:common] != current[:common]:
+                    logger.error(f"維度字典檔的 {kind} 編號與記憶體中不一致，保留記憶體中的編號")
+                    continue
+                # 只附加檔案中較新的編號，不覆蓋本行程尚未寫出的新編號
+                codes = self._codes[kind]
+                for code in range(len(current), len(values)):
+                    current.append(values[code])
+                    codes[values[code]] = code
+            self._signature = signature
+        return True
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """配發新編號的交易：持有字典檔的跨行程鎖，先載入其他行程已配發的編號，結束時寫回
+
+        每個行程都在鎖內接續檔案中的編號配發，不會把同一個編號配給不同的值；
+        path 為 None 時不需協調，直接執行。
+        """
+        if self.path is None:
+            yield
+            return
+        with self._transaction_lock:
+            if self._transaction_owner == threading.get_ident():
+                yield
+                return
+            with file_lock(self.path.with_name(self.path.name + '.lock')):
+                self._transaction_owner = threading.get_ident()
+                try:
+                    self.reload()
+                    yield
+                finally:
+                    # 中途失敗也寫回已配發的編號，避免其他行程再把它們配給不同的值
+                    try:
+                        self._write()
+                    finally:
+                        self._transaction_owner = None
+
+    def encode(self, kind: str, value: str) -> int:
+        """取得維度值的編號，未出現過的值配發新編號"""
+        code = self._codes[kind].get(value)
+        if code is not None:
+            return code
+        if self.path is not None and self._transaction_owner != threading.get_ident():
+            with self.transaction():
+                return self.encode(kind, value)
+        with self._lock:
+            code = self._codes[kind].get(value)
+            if code is None:
+                values = self._values[kind]
+                if len(values) > INT32_MAX:
+                    raise OverflowError(f"維度 {kind} 的編號超出 int32 範圍")
+                code = len(values)
+                values.append(value)
+                self._codes[kind][value] = code
+                self._dirty = True
+            return code
+
+    def encode_many(self, kind: str, values: Iterable[str]) -> List[int]:
+        values = list(values)
+        codes = self._codes[kind]
+        if self.path is not None and any(value not in codes for value in values):
+            # 有新值時整批在同一個交易內配發，只寫回一次字典檔
+            with self.transaction():
+                return [self.encode(kind, value) for value in values]
+        return [self.encode(kind, value) for value in values]
+
+    def lookup(self, kind: str, value: str) -> Optional[int]:
+        """查詢既有編號，不配發新編號（唯讀使用端）"""
+        return self._codes[kind].get(value)
+
+    def decode(self, kind: str, code: int) -> Optional[str]:
+        values = self._values[kind]
+        return values[code] if 0 <= code < len(values) else None
+
+    def values(self, kind: str) -> List[str]:
+        """依編號排列的維度值清單，可直接作為字典編碼的字典"""
+        with self._lock:
+            return list(self._values[kind])
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self._values.values())
+
+    def save(self):
+        """有新編號時寫回檔案；交易結束時會自動寫回，一般不需另外呼叫"""
+        if self.path is None or not self._dirty:
+            return
+        with self.transaction():
+            pass
+
+    def _write(self):
+        # 只在交易內（持有檔案鎖時）呼叫
+        if not self._dirty:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # 先寫暫存檔再替換，避免中斷時留下損壞的字典檔
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._values, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            stat = self.path.stat()
+            self._signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+檔案鎖 - 協調共用同一個數據目錄的多個行程
+
+收集器（main() 與 run_continuous_collection）、儀表板與報告可能同時讀寫 data/seo_metrics，
+這個模組以 flock 提供共享／獨佔鎖。每次取得鎖都開啟新的檔案描述子，
+因此同一行程的不同執行緒之間也會互斥。只依賴標準函式庫。
+"""
+
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:
+    # 沒有 fcntl 的平台（Windows）只能在行程內互斥，共享鎖退化為獨佔鎖
+    fcntl = None
+
+_fallback_locks: Dict[str, threading.Lock] = {}
+_fallback_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: Union[str, Path], shared: bool = False) -> Iterator[None]:
+    """持有 path 的共享（shared=True）或獨佔鎖；鎖檔不存在時自動建立"""
+    path = Path(path)
+    if fcntl is None:
+        with _fallback_guard:
+            lock = _fallback_locks.setdefault(str(path.resolve()), threading.Lock())
+        with lock:
+            yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        # 關閉檔案時自動釋放鎖
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
@@ -15,17 +15,38 @@ SEO 數據收集器 - 企業級數據採集系統
 """
 
 import asyncio
+import heapq
+import itertools
 import logging
+import math
+import os
+import queue
+import random
+import threading
 import time
-from dataclasses import dataclass, asdict
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union, Any
+from dataclasses import dataclass, asdict, field
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
 from pathlib import Path
 import json
-import pandas as pd
+import uuid
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from abc import ABC, abstractmethod
 
+try:
+    from .dimension_dictionary import DIMENSION_FIELDS, DimensionDictionary
+    from .file_lock import file_lock
+except ImportError:
+    # 直接執行 monitoring/seo_data_collector.py 時沒有套件上下文
+    from dimension_dictionary import DIMENSION_FIELDS, DimensionDictionary
+    from file_lock import file_lock
+
 # 設置日誌
 logging.basicConfig(
     level=logging.INFO,
@@ -47,12 +68,245 @@ class SEOMetrics:
     pages: Optional[List[str]] = None
     devices: Optional[Dict[str, int]] = None
     countries: Optional[Dict[str, int]] = None
+    site: Optional[str] = None
     
     def to_dict(self) -> Dict[str, Any]:
         """轉換為字典格式"""
         return asdict(self)
 
 
+class _GrowableArray:
+    """以倍增方式擴充的 NumPy 緩衝區，view() 回傳已填入部分的視圖而不複製"""
+    
+    def __init__(self, dtype: Any, capacity: int = 64):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+    
+    def append(self, value: Any):
+        if self._size == len(self._data):
+            self._data = np.resize(self._data, len(self._data) * 2)
+        self._data[self._size] = value
+        self._size += 1
+    
+    def extend(self, values: np.ndarray):
+        size = self._size + len(values)
+        if size > len(self._data):
+            self._data = np.resize(self._data, max(size, len(self._data) * 2))
+        self._data[self._size:size] = values
+        self._size = size
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+
+
+class SEOMetricsBatch:
+    """SEO 指標的欄式批次（struct-of-arrays）
+    
+    數值欄位直接寫入 NumPy 緩衝區，keywords / pages / devices / countries 經維度字典
+    編碼為 int32 後正規化為 (列索引, 值) 子表，以 offsets 表示每列的範圍；to_arrow()
+    以這些緩衝區直接建立 Arrow 陣列，數值、編號與 offsets 不經過 Python 物件或 asdict 深拷貝。
+    未指定 dimensions 時使用批次專屬的記憶體字典，寫入時再轉為儲存端字典的編號。
+    """
+    
+    NUMERIC_FIELDS = {'clicks': np.int64, 'impressions': np.int64, 'ctr': np.float64, 'position': np.float64}
+    LIST_FIELDS = ('keywords', 'pages')
+    MAP_FIELDS = ('devices', 'countries')
+    
+    def __init__(self, dimensions: Optional[DimensionDictionary] = None, capacity: int = 64):
+        self.dimensions = dimensions if dimensions is not None else DimensionDictionary()
+        self._timestamps = _GrowableArray('datetime64[us]', capacity)
+        self._sources: List[str] = []
+        self._sites: List[Optional[str]] = []
+        self._numeric = {name: _GrowableArray(dtype, capacity) for name, dtype in self.NUMERIC_FIELDS.items()}
+        self._valid = {name: _GrowableArray(np.bool_, capacity) for name in self.NUMERIC_FIELDS}
+        # 子表：offsets 長度為列數 + 1，第 i 列為 null 時以 offsets[i] 的 null 標記
+        self._offsets = {name: _GrowableArray(np.int32, capacity + 1)
+                         for name in self.LIST_FIELDS + self.MAP_FIELDS}
+        self._present = {name: _GrowableArray(np.bool_, capacity)
+                         for name in self.LIST_FIELDS + self.MAP_FIELDS}
+        for name in self._offsets:
+            self._offsets[name].append(0)
+        self._list_values = {name: _GrowableArray(np.int32, capacity * 4) for name in self.LIST_FIELDS}
+        self._map_keys = {name: _GrowableArray(np.int32, capacity * 4) for name in self.MAP_FIELDS}
+        self._map_values = {name: _GrowableArray(np.int64, capacity * 4) for name in self.MAP_FIELDS}
+    
+    def __len__(self) -> int:
+        return len(self._timestamps)
+    
+    def append(self, timestamp: datetime, source: str, site: Optional[str] = None,
+               keywords: Optional[List[str]] = None, pages: Optional[List[str]] = None,
+               devices: Optional[Dict[str, int]] = None, countries: Optional[Dict[str, int]] = None,
+               **numeric: Optional[float]):
+        """新增一列；欄位與 SEOMetrics 相同"""
+        self._timestamps.append(np.datetime64(timestamp, 'us'))
+        self._sources.append(source)
+        self._sites.append(site)
+        for name in self.NUMERIC_FIELDS:
+            value = numeric.pop(name, None)
+            self._numeric[name].append(0 if value is None else value)
+            self._valid[name].append(value is not None)
+        if numeric:
+            raise TypeError(f"未知的欄位: {', '.join(numeric)}")
+        for name, values in (('keywords', keywords), ('pages', pages)):
+            if values is not None:
+                for value in values:
+                    self._list_values[name].append(self.dimensions.encode(DIMENSION_FIELDS[name], value))
+            self._offsets[name].append(len(self._list_values[name]))
+            self._present[name].append(values is not None)
+        for name, mapping in (('devices', devices), ('countries', countries)):
+            if mapping is not None:
+                for key, value in mapping.items():
+                    self._map_keys[name].append(self.dimensions.encode(DIMENSION_FIELDS[name], key))
+                    self._map_values[name].append(value)
+            self._offsets[name].append(len(self._map_keys[name]))
+            self._present[name].append(mapping is not None)
+    
+    def extend(self, other: 'SEOMetricsBatch'):
+        """把另一個批次的列接在後面（例如同一天的多頁結果），維度編號轉為本批次字典的編號"""
+        self._timestamps.extend(other._timestamps.view())
+        self._sources.extend(other._sources)
+        self._sites.extend(other._sites)
+        for name in self.NUMERIC_FIELDS:
+            self._numeric[name].extend(other._numeric[name].view())
+            self._valid[name].extend(other._valid[name].view())
+        for name in self.LIST_FIELDS + self.MAP_FIELDS:
+            values = self._list_values[name] if name in self.LIST_FIELDS else self._map_keys[name]
+            other_values = other._list_values[name] if name in self.LIST_FIELDS else other._map_keys[name]
+            self._offsets[name].extend(other._offsets[name].view()[1:] + len(values))
+            self._present[name].extend(other._present[name].view())
+            values.extend(other._codes(name, other_values.view(), self.dimensions))
+        for name in self.MAP_FIELDS:
+            self._map_values[name].extend(other._map_values[name].view())
+    
+    def _codes(self, name: str, codes: np.ndarray, dimensions: Optional[DimensionDictionary]) -> np.ndarray:
+        """把批次字典的編號轉為 dimensions 的編號；同一份字典時直接沿用緩衝區"""
+        if dimensions is None or dimensions is self.dimensions:
+            return codes
+        kind = DIMENSION_FIELDS[name]
+        mapping = np.array(dimensions.encode_many(kind, self.dimensions.values(kind)), dtype=np.int32)
+        return mapping[codes]
+    
+    def _offsets_array(self, name: str) -> pa.Array:
+        mask = np.append(~self._present[name].view(), False)
+        return pa.array(self._offsets[name].view(), pa.int32(), mask=mask)
+    
+    def to_arrow(self, dimensions: Optional[DimensionDictionary] = None) -> pa.Table:
+        """轉為與 METRICS_SCHEMAS['seo_metrics'] 相同結構的 Arrow 表；指定 dimensions 時以該字典的編號輸出"""
+        columns = {
+            'timestamp': pa.array(self._timestamps.view(), pa.timestamp('us')),
+            'source': pa.array(self._sources, pa.string()),
+        }
+        for name in self.NUMERIC_FIELDS:
+            columns[name] = pa.array(self._numeric[name].view(), mask=~self._valid[name].view())
+        for name in self.LIST_FIELDS:
+            columns[name] = pa.ListArray.from_arrays(
+                self._offsets_array(name),
+                pa.array(self._codes(name, self._list_values[name].view(), dimensions), pa.int32()))
+        for name in self.MAP_FIELDS:
+            columns[name] = pa.MapArray.from_arrays(
+                self._offsets_array(name),
+                pa.array(self._codes(name, self._map_keys[name].view(), dimensions), pa.int32()),
+                pa.array(self._map_values[name].view(), pa.int64()))
+        columns['site'] = pa.array(self._sites, pa.string())
+        return pa.Table.from_pydict(columns, schema=METRICS_SCHEMAS['seo_metrics'])
+    
+    def partition_keys(self) -> set:
+        """批次涵蓋的 (來源, 日期)"""
+        days = self._timestamps.view().astype('datetime64[D]').astype(object)
+        return set(zip(self._sources, days))
+
+
+def record_count(items: List[Any]) -> int:
+    """數據清單的列數；欄式批次依其列數計算"""
+    return sum(len(item) if isinstance(item, SEOMetricsBatch) else 1 for item in items)
+
+
+def metric_rows(items: List[Any]) -> List[Dict[str, Any]]:
+    """展開為逐列字典（彙總計算使用）"""
+    rows: List[Dict[str, Any]] = []
+    for item in items:
+        if isinstance(item, SEOMetricsBatch):
+            rows.extend(decode_dimensions(item.to_arrow(), item.dimensions).to_pylist())
+        else:
+            rows.append(item.to_dict())
+    return rows
+
+
+def metric_partition_keys(items: List[Any]) -> set:
+    """數據涵蓋的 (來源, 日期)"""
+    keys: set = set()
+    for item in items:
+        if isinstance(item, SEOMetricsBatch):
+            keys |= item.partition_keys()
+        else:
+            keys.add((item.source, item.timestamp.date()))
+    return keys
+
+
+def _nested_offsets(column: pa.Array) -> pa.Array:
+    """切片後的 list / map 陣列 offsets 從 0 起算，null 列標記在 offsets 上"""
+    offsets = column.offsets.to_numpy(zero_copy_only=False)
+    mask = np.append(column.is_null().to_numpy(zero_copy_only=False), False)
+    return pa.array(offsets - offsets[0], pa.int32(), mask=mask)
+
+
+def map_entries(column: Union[pa.Array, pa.ChunkedArray]) -> pa.Table:
+    """把 map 欄位展開為 (row_index, key, value) 表，row_index 對應原表的列"""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    entries = column.cast(pa.list_(pa.struct([('key', column.type.key_type), ('value', column.type.item_type)])))
+    flat = pc.list_flatten(entries)
+    return pa.table({'row_index': pc.list_parent_indices(entries),
+                     'key': flat.field('key'), 'value': flat.field('value')})
+
+
+def decode_dimensions(table: pa.Table, dimensions: DimensionDictionary) -> pa.Table:
+    """把 keywords / pages / devices / countries 的 int32 編號還原為字串"""
+    for name, kind in DIMENSION_FIELDS.items():
+        if name not in table.column_names:
+            continue
+        column = table[name].combine_chunks()
+        labels = pa.array(dimensions.values(kind), pa.string())
+        if pa.types.is_map(column.type):
+            entries = map_entries(column)
+            decoded = pa.MapArray.from_arrays(_nested_offsets(column),
+                                              labels.take(entries['key'].combine_chunks()),
+                                              entries['value'].combine_chunks())
+        else:
+            decoded = pa.ListArray.from_arrays(_nested_offsets(column), labels.take(pc.list_flatten(column)))
+        table = table.set_column(table.schema.get_field_index(name), name, decoded)
+    return table
+
+
+def encode_dimensions(table: pa.Table, dimensions: DimensionDictionary) -> pa.Table:
+    """decode_dimensions 的反向：把仍以字串保存的維度欄位轉為 int32 編號（遷移舊數據用）"""
+    for name, kind in DIMENSION_FIELDS.items():
+        if name not in table.column_names:
+            continue
+        column = table[name].combine_chunks()
+        if pa.types.is_map(column.type):
+            if not pa.types.is_string(column.type.key_type):
+                continue
+            entries = map_entries(column)
+            values = entries['key'].combine_chunks()
+        else:
+            if not pa.types.is_string(column.type.value_type):
+                continue
+            values = pc.list_flatten(column)
+        # 每個不同的值只查一次字典
+        unique = pc.unique(values)
+        codes = pa.array(dimensions.encode_many(kind, unique.to_pylist()), pa.int32()).take(pc.index_in(values, unique))
+        if pa.types.is_map(column.type):
+            encoded = pa.MapArray.from_arrays(_nested_offsets(column), codes, entries['value'].combine_chunks())
+        else:
+            encoded = pa.ListArray.from_arrays(_nested_offsets(column), codes)
+        table = table.set_column(table.schema.get_field_index(name), name, encoded)
+    return table
+
+
 @dataclass
 class PerformanceMetrics:
     """效能指標數據結構"""
@@ -90,13 +344,94 @@ class AISearchMetrics:
         return asdict(self)
 
 
+@dataclass
+class CollectionStats:
+    """單一收集器的執行統計"""
+    runs: int = 0
+    successes: int = 0
+    timeouts: int = 0
+    failures: int = 0
+    total_seconds: float = 0.0
+    last_seconds: Optional[float] = None
+    last_status: Optional[str] = None
+    last_records: int = 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為字典格式"""
+        return asdict(self)
+
+
+class WatermarkStore:
+    """收集進度水位線 - 以 JSON 檔保存各收集器、各站點最後一個已完整收集的日期，重啟後仍可增量收集"""
+    
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._watermarks: Dict[str, str] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._watermarks = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"載入水位線失敗，將重新回補: {str(e)}")
+    
+    @staticmethod
+    def key(collector: str, site: Optional[str]) -> str:
+        return f"{collector}|{site or ''}"
+    
+    def get(self, collector: str, site: Optional[str]) -> Optional[date]:
+        value = self._watermarks.get(self.key(collector, site))
+        return date.fromisoformat(value) if value else None
+    
+    def set(self, collector: str, site: Optional[str], day: date):
+        """推進水位線並寫回檔案；水位線只前進不後退"""
+        with self._lock:
+            key = self.key(collector, site)
+            current = self._watermarks.get(key)
+            if current and date.fromisoformat(current) >= day:
+                return
+            self._watermarks[key] = day.isoformat()
+            # 先寫暫存檔再替換，避免中斷時留下損壞的水位線檔
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._watermarks, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
 class DataCollectorBase(ABC):
     """數據收集器基礎類別"""
     
+    # 排程預設值（秒），可由各收集器配置中的 interval / jitter / max_concurrency 覆寫
+    default_interval: float = 3600
+    default_jitter: float = 60
+    default_max_concurrency: int = 1
+    # 單次收集的逾時上限（秒），逾時即取消
+    default_timeout: float = 300
+    # 增量收集：僅每日彙總型來源啟用，依水位線只抓取新的完整日期
+    incremental: bool = False
+    # 重新抓取水位線前的天數，補上來源延遲修正的數據
+    default_lookback_days: int = 2
+    # 沒有水位線時（首次執行）回補的天數
+    default_backfill_days: int = 7
+    # 串流收集：持續收集時改走 collect_batches 管線，適合大量分頁匯出的來源
+    streaming: bool = False
+    default_batch_size: int = 500
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.name = self.__class__.__name__
         self.last_collection_time: Optional[datetime] = None
+        self.interval = float(config.get('interval', self.default_interval))
+        self.jitter = float(config.get('jitter', self.default_jitter))
+        self.max_concurrency = int(config.get('max_concurrency', self.default_max_concurrency))
+        self.timeout = float(config.get('timeout', self.default_timeout))
+        self.stats = CollectionStats()
+        self.lookback_days = int(config.get('lookback_days', self.default_lookback_days))
+        self.backfill_days = int(config.get('backfill_days', self.default_backfill_days))
+        self.batch_size = int(config.get('batch_size', self.default_batch_size))
+        self.watermarks: Optional[WatermarkStore] = None
+        # 本次收集完成、待數據寫入後才提交的水位線
+        self.pending_watermark: Optional[date] = None
         
     @abstractmethod
     async def collect_data(self) -> List[Union[SEOMetrics, PerformanceMetrics, AISearchMetrics]]:
@@ -116,44 +451,137 @@ class DataCollectorBase(ABC):
     def get_required_config_keys(self) -> List[str]:
         """獲取必要的配置鍵值"""
         pass
+    
+    @property
+    def site(self) -> Optional[str]:
+        """水位線所屬的站點或資源識別"""
+        return None
+    
+    def collection_window(self, today: Optional[date] = None) -> List[date]:
+        """依水位線計算本次要收集的日期：從水位線減去回看天數到昨天（最後一個完整日）"""
+        last_complete_day = (today or date.today()) - timedelta(days=1)
+        watermark = self.watermarks.get(self.name, self.site) if self.watermarks is not None else None
+        if watermark is None:
+            start = last_complete_day - timedelta(days=self.backfill_days - 1)
+        else:
+            start = watermark + timedelta(days=1 - self.lookback_days)
+        days = []
+        day = start
+        while day <= last_complete_day:
+            days.append(day)
+            day += timedelta(days=1)
+        self.pending_watermark = last_complete_day if days else None
+        return days
+    
+    def commit_watermark(self):
+        """數據寫入成功後推進水位線"""
+        if self.pending_watermark is not None and self.watermarks is not None:
+            self.watermarks.set(self.name, self.site, self.pending_watermark)
+        self.pending_watermark = None
+    
+    async def collect_batches(self) -> AsyncIterator[List[Union[SEOMetrics, PerformanceMetrics, AISearchMetrics]]]:
+        """串流收集：逐批產生數據。預設把 collect_data 的結果切批，可分頁的來源應覆寫為邊抓邊產生；
+        同一天的多頁需連續產生，管線在出現新日期時才合併寫入前一天"""
+        data = await self.collect_data()
+        for offset in range(0, len(data), self.batch_size):
+            yield data[offset:offset + self.batch_size]
+    
+    async def run_collection(self) -> List[Union[SEOMetrics, PerformanceMetrics, AISearchMetrics]]:
+        """在逾時限制內執行 collect_data 並更新執行統計；逾時時取消收集並拋出 asyncio.TimeoutError"""
+        return await self.timed(self.collect_data())
+    
+    async def timed(self, awaitable: Awaitable[Any]) -> Any:
+        """在逾時限制內等待收集工作並更新執行統計；結果可為數據清單或筆數"""
+        self.stats.runs += 1
+        started = time.perf_counter()
+        status = 'failed'
+        try:
+            result = await asyncio.wait_for(awaitable, timeout=self.timeout)
+            status = 'ok'
+            self.stats.successes += 1
+            self.stats.last_records = result if isinstance(result, int) else record_count(result)
+            return result
+        except asyncio.TimeoutError:
+            status = 'timeout'
+            self.stats.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            status = 'cancelled'
+            raise
+        except Exception:
+            self.stats.failures += 1
+            raise
+        finally:
+            if status != 'ok':
+                # 逾時、取消或失敗時數據不完整，不推進水位線
+                self.pending_watermark = None
+            elapsed = time.perf_counter() - started
+            self.stats.total_seconds += elapsed
+            self.stats.last_seconds = elapsed
+            self.stats.last_status = status
 
 
 class GoogleSearchConsoleCollector(DataCollectorBase):
     """Google Search Console 數據收集器"""
     
+    # GSC 數據每日更新且 API 配額昂貴，每 6 小時拉取一次即可
+    default_interval = 6 * 3600
+    default_jitter = 600
+    # GSC 數據約有 2-3 天延遲，回看較長的區間
+    incremental = True
+    default_lookback_days = 3
+    # 關鍵字 × 頁面 × 國家的匯出量大，持續收集時以串流管線邊抓邊寫
+    streaming = True
+    
     def get_required_config_keys(self) -> List[str]:
         return ['service_account_file', 'site_url']
     
-    async def collect_data(self) -> List[SEOMetrics]:
+    @property
+    def site(self) -> Optional[str]:
+        return self.config.get('site_url')
+    
+    def fetch_day(self, day: date) -> SEOMetricsBatch:
+        """取得單日數據（模擬 Search Console API 的一頁結果），直接填入欄式批次"""
+        batch = SEOMetricsBatch()
+        # 生成模擬數據 (實際實作需要 Google API)
+        batch.append(
+            timestamp=datetime.combine(day, datetime.min.time()),
+            source='google_search_console',
+            site=self.site,
+            clicks=np.random.randint(50, 200),
+            impressions=np.random.randint(500, 2000),
+            ctr=np.random.uniform(0.02, 0.15),
+            position=np.random.uniform(3, 15),
+            keywords=['點擊遊戲', 'Click Fun', 'PWA遊戲', '免費遊戲'],
+            pages=['/index.html', '/game', '/about'],
+            devices={'desktop': 60, 'mobile': 35, 'tablet': 5},
+            countries={'TW': 70, 'US': 15, 'JP': 10, 'other': 5}
+        )
+        return batch
+    
+    async def collect_batches(self) -> AsyncIterator[List[SEOMetricsBatch]]:
+        """逐日分頁產生數據，下游可在抓取下一頁時同步寫入前一頁"""
+        try:
+            # 只收集水位線之後（含回看區間）的完整日期
+            for day in self.collection_window():
+                yield [self.fetch_day(day)]
+                # 讓出事件迴圈，模擬分頁請求之間的等待
+                await asyncio.sleep(0)
+        except BaseException:
+            # 收集失敗、逾時取消或下游提早關閉時不推進水位線，下次重新抓取同一區間
+            self.pending_watermark = None
+            raise
+    
+    async def collect_data(self) -> List[SEOMetricsBatch]:
         """收集 Google Search Console 數據"""
         try:
             logger.info(f"{self.name}: 開始收集數據")
             
-            # 模擬數據收集 (實際實作需要 Google API)
             current_time = datetime.now()
-            metrics = []
-            
-            # 模擬 7 天的數據
-            for i in range(7):
-                date = current_time - timedelta(days=i)
-                
-                # 生成模擬數據
-                metric = SEOMetrics(
-                    timestamp=date,
-                    source='google_search_console',
-                    clicks=np.random.randint(50, 200),
-                    impressions=np.random.randint(500, 2000),
-                    ctr=np.random.uniform(0.02, 0.15),
-                    position=np.random.uniform(3, 15),
-                    keywords=['點擊遊戲', 'Click Fun', 'PWA遊戲', '免費遊戲'],
-                    pages=['/index.html', '/game', '/about'],
-                    devices={'desktop': 60, 'mobile': 35, 'tablet': 5},
-                    countries={'TW': 70, 'US': 15, 'JP': 10, 'other': 5}
-                )
-                metrics.append(metric)
+            metrics = [batch async for page in self.collect_batches() for batch in page]
             
             self.last_collection_time = current_time
-            logger.info(f"{self.name}: 成功收集 {len(metrics)} 筆數據")
+            logger.info(f"{self.name}: 成功收集 {record_count(metrics)} 筆數據")
             return metrics
             
         except Exception as e:
@@ -164,24 +592,31 @@ class GoogleSearchConsoleCollector(DataCollectorBase):
 class GoogleAnalyticsCollector(DataCollectorBase):
     """Google Analytics 4 數據收集器"""
     
+    default_interval = 3600
+    default_jitter = 300
+    incremental = True
+    
     def get_required_config_keys(self) -> List[str]:
         return ['property_id', 'credentials_path']
     
-    async def collect_data(self) -> List[SEOMetrics]:
+    @property
+    def site(self) -> Optional[str]:
+        return self.config.get('property_id')
+    
+    async def collect_data(self) -> List[SEOMetricsBatch]:
         """收集 Google Analytics 數據"""
         try:
             logger.info(f"{self.name}: 開始收集數據")
             
             current_time = datetime.now()
-            metrics = []
+            batch = SEOMetricsBatch()
             
-            # 模擬 7 天的數據
-            for i in range(7):
-                date = current_time - timedelta(days=i)
-                
-                metric = SEOMetrics(
-                    timestamp=date,
+            # 只收集水位線之後（含回看區間）的完整日期
+            for day in self.collection_window():
+                batch.append(
+                    timestamp=datetime.combine(day, datetime.min.time()),
                     source='google_analytics',
+                    site=self.site,
                     clicks=np.random.randint(40, 180),
                     impressions=None,  # GA 不提供 impressions
                     ctr=None,
@@ -191,13 +626,14 @@ class GoogleAnalyticsCollector(DataCollectorBase):
                     devices={'desktop': 55, 'mobile': 40, 'tablet': 5},
                     countries={'TW': 75, 'US': 12, 'JP': 8, 'other': 5}
                 )
-                metrics.append(metric)
             
             self.last_collection_time = current_time
-            logger.info(f"{self.name}: 成功收集 {len(metrics)} 筆數據")
-            return metrics
+            logger.info(f"{self.name}: 成功收集 {len(batch)} 筆數據")
+            return [batch] if len(batch) else []
             
         except Exception as e:
+            # 收集失敗時不推進水位線，下次重新抓取同一區間
+            self.pending_watermark = None
             logger.error(f"{self.name}: 數據收集失敗 - {str(e)}")
             return []
 
@@ -205,6 +641,11 @@ class GoogleAnalyticsCollector(DataCollectorBase):
 class LighthouseCollector(DataCollectorBase):
     """Lighthouse 效能數據收集器"""
     
+    # 單頁探測成本低，可較頻繁執行
+    default_interval = 900
+    default_jitter = 60
+    default_max_concurrency = 2
+    
     def get_required_config_keys(self) -> List[str]:
         return ['target_url', 'api_key']
     
@@ -242,6 +683,9 @@ class LighthouseCollector(DataCollectorBase):
 class AISearchCollector(DataCollectorBase):
     """AI 搜尋平台數據收集器"""
     
+    default_interval = 3 * 3600
+    default_jitter = 900
+    
     def get_required_config_keys(self) -> List[str]:
         return ['platforms', 'test_queries']
     
@@ -282,6 +726,1000 @@ class AISearchCollector(DataCollectorBase):
             return []
 
 
+# 各數據類型的 Arrow 結構；明確宣告可避免不同批次推斷出不一致的型別
+METRICS_SCHEMAS: Dict[str, pa.Schema] = {
+    'seo_metrics': pa.schema([
+        ('timestamp', pa.timestamp('us')),
+        ('source', pa.string()),
+        ('clicks', pa.int64()),
+        ('impressions', pa.int64()),
+        ('ctr', pa.float64()),
+        ('position', pa.float64()),
+        # 維度欄位保存維度字典的 int32 編號，以 decode_dimensions() 還原字串
+        ('keywords', pa.list_(pa.int32())),
+        ('pages', pa.list_(pa.int32())),
+        ('devices', pa.map_(pa.int32(), pa.int64())),
+        ('countries', pa.map_(pa.int32(), pa.int64())),
+        ('site', pa.string()),
+    ]),
+    'performance_metrics': pa.schema([
+        ('timestamp', pa.timestamp('us')),
+        ('source', pa.string()),
+        ('lighthouse_seo', pa.int64()),
+        ('lighthouse_performance', pa.int64()),
+        ('lighthouse_accessibility', pa.int64()),
+        ('lighthouse_best_practices', pa.int64()),
+        ('core_web_vitals_lcp', pa.float64()),
+        ('core_web_vitals_fid', pa.float64()),
+        ('core_web_vitals_cls', pa.float64()),
+        ('ttfb', pa.float64()),
+        ('page_load_time', pa.float64()),
+    ]),
+    'ai_search_metrics': pa.schema([
+        ('timestamp', pa.timestamp('us')),
+        ('platform', pa.string()),
+        ('query', pa.string()),
+        ('mentioned', pa.bool_()),
+        ('position', pa.int64()),
+        ('accuracy_score', pa.float64()),
+        ('citation_quality', pa.string()),
+        ('response_quality', pa.float64()),
+    ]),
+}
+
+# 分區欄位：data_type=.../source=.../date=YYYY-MM-DD
+PARTITION_SCHEMA = pa.schema([
+    ('data_type', pa.string()),
+    ('source', pa.string()),
+    ('date', pa.string()),
+])
+
+# 沒有 source 欄位的數據類型所使用的分區值
+DEFAULT_PARTITION_SOURCES = {'ai_search_metrics': 'ai_search'}
+
+# 附加型數據壓實時的去重鍵值：來源、時間，以及 AI 搜尋的平台與查詢維度。
+# seo_metrics 以 upsert 寫入、分區內已無重複，且同一天可有多列（分頁結果），壓實時不去重
+DEDUP_KEYS: Dict[str, List[str]] = {
+    'performance_metrics': ['source', 'timestamp'],
+    'ai_search_metrics': ['source', 'timestamp', 'platform', 'query'],
+}
+
+# upsert 時標記數據新舊的暫存欄位，不寫入檔案
+GENERATION_COLUMN = '__generation'
+
+# 低基數字串欄位使用字典編碼
+DICTIONARY_COLUMNS = ['site', 'platform', 'query', 'citation_quality']
+
+
+class PartitionedParquetStore:
+    """以 Hive 分區（data_type/source/date）保存指標的 Parquet 數據集，讀取時只開啟日期範圍內的分區
+    
+    多個行程可共用同一個目錄：改寫分區（upsert、壓實、遷移）以 .rewrite.lock 互斥；
+    新檔先以 . 開頭的暫存檔寫入，再於 .publish.lock 的獨佔鎖內一次換上並移除舊檔，
+    read() 在共享鎖內列出並讀取檔案，因此讀取端只會看到改寫前或改寫後的完整分區。
+    """
+    
+    def __init__(self, root: Union[str, Path], row_group_size: int = 64 * 1024,
+                 max_rows_per_file: int = 1024 * 1024, target_file_bytes: int = 64 * 1024 * 1024,
+                 dimensions: Optional[DimensionDictionary] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.dimensions = (dimensions if dimensions is not None
+                           else DimensionDictionary(self.root / 'dimensions.json'))
+        self.row_group_size = row_group_size
+        self.max_rows_per_file = max_rows_per_file
+        self.target_file_bytes = target_file_bytes
+        self.rewrite_lock_path = self.root / '.rewrite.lock'
+        self.publish_lock_path = self.root / '.publish.lock'
+        self.partitioning = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+        self.file_format = ds.ParquetFileFormat()
+    
+    def to_row(self, metric: Any) -> Dict[str, Any]:
+        row = metric.to_dict()
+        for key, value in row.items():
+            kind = DIMENSION_FIELDS.get(key) if isinstance(metric, SEOMetrics) else None
+            if kind and value is not None:
+                value = ({self.dimensions.encode(kind, name): count for name, count in value.items()}
+                         if isinstance(value, dict) else self.dimensions.encode_many(kind, value))
+            # map 欄位以 (鍵, 值) 序列轉換，相容各版本 pyarrow
+            row[key] = list(value.items()) if isinstance(value, dict) else value
+        return row
+    
+    def to_table(self, data_type: str, metrics_list: List[Any], generations: bool = False) -> pa.Table:
+        """將 dataclass 指標與欄式批次轉為含分區欄位的 Arrow 表，維度值轉為儲存端字典的編號；
+        generations 為 True 時加上 GENERATION_COLUMN：清單中每個欄式批次、每筆 dataclass 各為一代，依順序遞增"""
+        tables, rows, row_generations = [], [], []
+        # 整批在同一個字典交易內配發編號；交易結束時先寫回字典檔，數據檔才不會引用到字典裡沒有的編號
+        with self.dimensions.transaction():
+            for generation, metric in enumerate(metrics_list):
+                if isinstance(metric, SEOMetricsBatch):
+                    batch_table = metric.to_arrow(self.dimensions)
+                    if generations:
+                        batch_table = batch_table.append_column(
+                            GENERATION_COLUMN, pa.array(np.full(len(batch_table), generation, dtype=np.int32)))
+                    tables.append(batch_table)
+                else:
+                    rows.append(self.to_row(metric))
+                    row_generations.append(generation)
+        if rows or not tables:
+            row_table = pa.Table.from_pylist(rows, schema=METRICS_SCHEMAS[data_type])
+            if generations:
+                row_table = row_table.append_column(GENERATION_COLUMN, pa.array(row_generations, pa.int32()))
+            tables.append(row_table)
+        table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+        if 'source' not in table.column_names:
+            table = table.append_column(
+                'source', pa.array([DEFAULT_PARTITION_SOURCES[data_type]] * len(table), pa.string()))
+        dates = pc.strftime(table['timestamp'], format='%Y-%m-%d')
+        table = table.append_column('date', dates)
+        return table.append_column('data_type', pa.array([data_type] * len(table), pa.string()))
+    
+    def rewriting(self):
+        """改寫分區（upsert、壓實、遷移）的跨行程互斥鎖，避免同時替換同一批檔案"""
+        return file_lock(self.rewrite_lock_path)
+    
+    def reading(self):
+        """讀取端的共享鎖：持有期間不會有分區換上新檔或移除舊檔；直接掃描 dataset() 時需在鎖內進行"""
+        return file_lock(self.publish_lock_path, shared=True)
+    
+    def publish(self, tmp_paths: List[Path], replaced: Optional[List[Path]] = None):
+        """在獨佔鎖內把暫存檔換為正式檔名並移除被取代的檔案，讀取端不會同時看到新舊檔案"""
+        with file_lock(self.publish_lock_path):
+            for tmp_path in tmp_paths:
+                os.replace(tmp_path, tmp_path.with_name(tmp_path.name[1:-len('.tmp')]))
+            for path in replaced or []:
+                path.unlink(missing_ok=True)
+    
+    def write_options(self) -> ds.FileWriteOptions:
+        return self.file_format.make_write_options(compression='snappy', use_dictionary=DICTIONARY_COLUMNS)
+    
+    def append(self, data_type: str, metrics_list: List[Any]) -> int:
+        """以新檔案附加到對應分區，不改寫既有檔案"""
+        table = self.to_table(data_type, metrics_list)
+        written: List[Path] = []
+        try:
+            ds.write_dataset(
+                table,
+                base_dir=str(self.root),
+                format=self.file_format,
+                file_options=self.write_options(),
+                partitioning=self.partitioning,
+                # 每批使用唯一檔名，同一分區可安全地多次附加；先寫成暫存檔，全部完成後才換上
+                basename_template=f".part-{uuid.uuid4().hex}-{{i}}.parquet.tmp",
+                existing_data_behavior='overwrite_or_ignore',
+                max_rows_per_group=min(self.row_group_size, self.max_rows_per_file),
+                max_rows_per_file=self.max_rows_per_file,
+                file_visitor=lambda written_file: written.append(Path(written_file.path)),
+            )
+        except BaseException:
+            for tmp_path in written:
+                tmp_path.unlink(missing_ok=True)
+            raise
+        self.publish(written)
+        return len(table)
+    
+    def upsert(self, data_type: str, metrics_list: List[Any], keys: List[str]) -> int:
+        """與分區內既有數據合併後改寫分區，重複寫入結果相同
+        
+        同一鍵值以較新一代的數據整批取代既有列；同一個欄式批次內同鍵值的多列（例如同一天的多頁結果）全部保留。
+        """
+        table = self.to_table(data_type, metrics_list, generations=True)
+        partitions = sorted(set(zip(table['source'].to_pylist(), table['date'].to_pylist())))
+        for source, day in partitions:
+            mask = pc.and_(pc.equal(table['source'], source), pc.equal(table['date'], day))
+            rows = table.filter(mask).drop(['data_type', 'source', 'date'])
+            partition_dir = self.partition_dir(data_type, source, day)
+            with self.rewriting():
+                existing = self.partition_files(partition_dir)
+                if existing:
+                    file_schema = rows.schema.remove(rows.schema.get_field_index(GENERATION_COLUMN))
+                    previous = self.read_files(existing, file_schema)
+                    # 既有數據視為最舊的一代
+                    previous = previous.append_column(
+                        GENERATION_COLUMN, pa.array(np.full(len(previous), -1, dtype=np.int32)))
+                    rows = pa.concat_tables([previous, rows])
+                self.rewrite_partition(partition_dir, latest_generation(rows, partition_keys(keys)), existing)
+        return len(table)
+    
+    def migrate_string_dimensions(self) -> int:
+        """一次性遷移：把維度欄位仍以字串保存的 seo_metrics 分區改寫為維度編號，回傳改寫的分區數"""
+        marker = self.root / '.dimensions-migrated'
+        if marker.exists():
+            return 0
+        schema = dataset_schema('seo_metrics')
+        file_schema = pa.schema([field for field in schema if field.name not in PARTITION_SCHEMA.names])
+        migrated = 0
+        for partition_dir in self.partitions('seo_metrics'):
+            with self.rewriting():
+                files = self.partition_files(partition_dir)
+                # 只讀檔尾的結構判斷是否為舊格式
+                if all(pq.read_schema(path).field('keywords').type == file_schema.field('keywords').type
+                       for path in files):
+                    continue
+                with self.dimensions.transaction():
+                    tables = [encode_dimensions(pq.ParquetFile(path).read(), self.dimensions) for path in files]
+                table = pa.concat_tables([table.select(file_schema.names).cast(file_schema) for table in tables])
+                self.rewrite_partition(partition_dir, table, files)
+                migrated += 1
+        marker.touch()
+        return migrated
+    
+    def partitions(self, data_type: Optional[str] = None) -> List[Path]:
+        """列出所有（或指定數據類型的）date 分區目錄"""
+        pattern = f"data_type={data_type}/source=*/date=*" if data_type else "data_type=*/source=*/date=*"
+        return sorted(path for path in self.root.glob(pattern) if path.is_dir())
+    
+    def compact_partition(self, partition_dir: Path, min_files: int = 2) -> Optional[Dict[str, int]]:
+        """將分區內的小檔合併為接近 target_file_bytes 的檔案，有去重鍵值的數據類型一併去重；無需壓實時回傳 None"""
+        data_type = partition_dir.parent.parent.name[len('data_type='):]
+        with self.rewriting():
+            files = self.partition_files(partition_dir)
+            # 已達目標大小的檔案不再改寫
+            small = [path for path in files if path.stat().st_size < self.target_file_bytes // 2]
+            if len(small) < min_files:
+                return None
+            schema = dataset_schema(data_type)
+            file_schema = pa.schema([field for field in schema if field.name not in PARTITION_SCHEMA.names])
+            table = self.read_files(small, file_schema)
+            keys = DEDUP_KEYS.get(data_type)
+            compacted = deduplicate(table, partition_keys(keys)) if keys else table
+            input_bytes = sum(path.stat().st_size for path in small)
+            # 以輸入檔的平均列大小估算每個輸出檔的列數
+            bytes_per_row = max(input_bytes / max(len(table), 1), 1)
+            rows_per_file = max(int(self.target_file_bytes / bytes_per_row), 1)
+            written = self.rewrite_partition(partition_dir, compacted, small, rows_per_file)
+        return {
+            'files_before': len(small),
+            'files_after': written,
+            'rows_before': len(table),
+            'rows_after': len(compacted),
+        }
+    
+    def compact(self, data_type: Optional[str] = None, min_files: int = 2) -> Dict[str, int]:
+        """逐一壓實所有分區，回傳彙總統計"""
+        totals = {'partitions': 0, 'files_before': 0, 'files_after': 0, 'rows_before': 0, 'rows_after': 0}
+        for partition_dir in self.partitions(data_type):
+            try:
+                result = self.compact_partition(partition_dir, min_files)
+            except (OSError, pa.ArrowException) as e:
+                logger.error(f"壓實分區失敗 {partition_dir}: {str(e)}")
+                continue
+            if result is None:
+                continue
+            totals['partitions'] += 1
+            for key, value in result.items():
+                totals[key] += value
+        return totals
+    
+    def partition_dir(self, data_type: str, source: str, day: str) -> Path:
+        return self.root / f"data_type={data_type}" / f"source={source}" / f"date={day}"
+    
+    @staticmethod
+    def partition_files(partition_dir: Path) -> List[Path]:
+        if not partition_dir.is_dir():
+            return []
+        # 與 pyarrow 一致，忽略 . 與 _ 開頭的暫存檔
+        return sorted(path for path in partition_dir.iterdir()
+                      if path.suffix == '.parquet' and not path.name.startswith(('.', '_')))
+    
+    @staticmethod
+    def read_files(files: List[Path], schema: pa.Schema) -> pa.Table:
+        return ds.dataset([str(path) for path in files], schema=schema, format='parquet').to_table()
+    
+    def rewrite_partition(self, partition_dir: Path, table: pa.Table, replaced: List[Path],
+                          rows_per_file: Optional[int] = None) -> int:
+        """寫入新檔後以 publish() 一次換掉被取代的舊檔，回傳新檔數；需在 rewriting() 內呼叫"""
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        rows_per_file = min(rows_per_file or self.max_rows_per_file, self.max_rows_per_file)
+        batch = uuid.uuid4().hex
+        tmp_paths = []
+        try:
+            for index, offset in enumerate(range(0, max(len(table), 1), rows_per_file)):
+                tmp_path = partition_dir / f".part-{batch}-{index}.parquet.tmp"
+                tmp_paths.append(tmp_path)
+                pq.write_table(table.slice(offset, rows_per_file), tmp_path, compression='snappy',
+                               use_dictionary=DICTIONARY_COLUMNS, row_group_size=self.row_group_size)
+        except BaseException:
+            for tmp_path in tmp_paths:
+                tmp_path.unlink(missing_ok=True)
+            raise
+        # 全部寫完才換上新檔，中途失敗時舊檔維持不變
+        self.publish(tmp_paths, replaced)
+        return len(tmp_paths)
+    
+    def dataset(self, data_type: str, start_date: date, end_date: date,
+                sources: Optional[List[str]] = None) -> Optional[ds.Dataset]:
+        """建立只涵蓋日期範圍內分區的數據集；範圍內沒有數據時回傳 None。
+        數據集固定在建立當下的檔案清單，需在 reading() 內建立並掃描完畢"""
+        type_dir = self.root / f"data_type={data_type}"
+        if not type_dir.is_dir():
+            return None
+        start, end = start_date.isoformat(), end_date.isoformat()
+        files = []
+        for source_dir in type_dir.iterdir():
+            if not source_dir.name.startswith('source='):
+                continue
+            if sources is not None and source_dir.name[len('source='):] not in sources:
+                continue
+            # 只列出分區目錄名稱比對日期，不開啟範圍外的檔案
+            for date_dir in source_dir.iterdir():
+                day = date_dir.name[len('date='):]
+                if date_dir.name.startswith('date=') and start <= day <= end:
+                    files.extend(str(path) for path in self.partition_files(date_dir))
+        if not files:
+            return None
+        return ds.dataset(files, schema=dataset_schema(data_type), format='parquet',
+                          partitioning=self.partitioning, partition_base_dir=str(self.root))
+    
+    def read(self, data_type: str, start_date: date, end_date: date,
+             columns: Optional[List[str]] = None, filter: Optional[ds.Expression] = None,
+             sources: Optional[List[str]] = None) -> pa.Table:
+        """讀取日期範圍內的數據，可指定欄位投影與額外過濾條件；列出與讀取檔案都在 reading() 內進行"""
+        with self.reading():
+            dataset = self.dataset(data_type, start_date, end_date, sources)
+            if dataset is None:
+                table = dataset_schema(data_type).empty_table()
+                return table.select(columns) if columns else table
+            return dataset.to_table(columns=columns, filter=filter)
+
+
+def dataset_schema(data_type: str) -> pa.Schema:
+    """數據集的完整結構：檔案內欄位加上由目錄還原的分區欄位"""
+    schema = METRICS_SCHEMAS[data_type]
+    if 'source' in schema.names:
+        schema = schema.remove(schema.get_field_index('source'))
+    return pa.unify_schemas([schema, PARTITION_SCHEMA])
+
+
+def partition_keys(keys: List[str]) -> List[str]:
+    """分區內去重用的鍵值；分區欄位已由目錄表示，不在檔案內"""
+    return [key for key in keys if key not in PARTITION_SCHEMA.names]
+
+
+def _join_key(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """join 不會配對 null 鍵值，字串鍵值的 null 以空字串代替"""
+    return pc.fill_null(column, '') if pa.types.is_string(column.type) else column
+
+
+def latest_generation(table: pa.Table, keys: List[str]) -> pa.Table:
+    """每個鍵值只保留 GENERATION_COLUMN 最大的那一代，回傳不含該欄位的表"""
+    data = table.drop([GENERATION_COLUMN])
+    if len(table) == 0:
+        return data
+    key_names = [f'__key{i}' for i in range(len(keys))]
+    index = pa.table({
+        **{name: _join_key(table[key]) for name, key in zip(key_names, keys)},
+        '__row': pa.array(np.arange(len(table), dtype=np.int64)),
+        GENERATION_COLUMN: table[GENERATION_COLUMN],
+    })
+    latest = index.group_by(key_names).aggregate([(GENERATION_COLUMN, 'max')])
+    # 只以鍵值與列索引 join，巢狀欄位不參與
+    joined = index.join(latest, key_names, join_type='inner')
+    rows = joined.filter(pc.equal(joined[GENERATION_COLUMN], joined[f'{GENERATION_COLUMN}_max']))['__row']
+    # 依原始順序取回保留的列
+    return data.take(pc.take(rows, pc.sort_indices(rows)))
+
+
+def deduplicate(table: pa.Table, keys: List[str]) -> pa.Table:
+    """相同鍵值只保留最後出現的列"""
+    if len(table) == 0:
+        return table
+    indexed = table.append_column('__row', pa.array(np.arange(len(table), dtype=np.int64)))
+    rows = indexed.group_by(keys).aggregate([('__row', 'max')])['__row_max']
+    # 依原始順序取回保留的列
+    return table.take(pc.take(rows, pc.sort_indices(rows)))
+
+
+# 舊版檔名 {data_type}_{YYYYmmdd_HHMMSS}.parquet 對應的指標類別
+LEGACY_METRIC_CLASSES = {
+    'seo_metrics': SEOMetrics,
+    'performance_metrics': PerformanceMetrics,
+    'ai_search_metrics': AISearchMetrics,
+}
+
+
+def legacy_metrics(data_type: str, table: pa.Table) -> List[Any]:
+    """把舊版以 pandas 寫在根目錄的檔案還原為指標 dataclass
+    
+    pandas 寫出的缺值數值欄位為 NaN、整數欄位可能變為浮點數，裝置／國家的 dict 則推斷為 struct（缺少的鍵為 null）。
+    """
+    schema = METRICS_SCHEMAS[data_type]
+    metric_class = LEGACY_METRIC_CLASSES[data_type]
+    if 'timestamp' in table.column_names:
+        # pandas 以奈秒保存，截斷為與數據集相同的微秒
+        table = table.set_column(table.schema.get_field_index('timestamp'), 'timestamp',
+                                 table['timestamp'].cast(pa.timestamp('us'), safe=False))
+    metrics = []
+    for row in table.to_pylist():
+        values = {}
+        for schema_field in schema:
+            value = row.get(schema_field.name)
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            elif isinstance(value, dict):
+                value = {key: count for key, count in value.items() if count is not None}
+            elif value is not None and pa.types.is_map(schema_field.type):
+                value = dict(value)
+            elif value is not None and pa.types.is_integer(schema_field.type):
+                value = int(value)
+            values[schema_field.name] = value
+        metrics.append(metric_class(**values))
+    return metrics
+
+
+class QuantileSketch:
+    """可合併的對數分桶分位數草圖，相對誤差約為 relative_accuracy"""
+    
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+    
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            # 指標皆為非負值，0 與負值歸入零桶
+            self.zero_count += count
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + count
+    
+    def merge(self, other: 'QuantileSketch'):
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+    
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.zero_count + sum(self.bins.values())
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # 回傳分桶的代表值，確保相對誤差在範圍內
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+    
+    def to_json(self) -> str:
+        return json.dumps({'a': self.relative_accuracy, 'z': self.zero_count,
+                           'b': {str(key): count for key, count in self.bins.items()}})
+    
+    @classmethod
+    def from_json(cls, text: Optional[str]) -> 'QuantileSketch':
+        if not text:
+            return cls()
+        payload = json.loads(text)
+        sketch = cls(payload['a'])
+        sketch.zero_count = payload['z']
+        sketch.bins = {int(key): count for key, count in payload['b'].items()}
+        return sketch
+
+
+# 各數據類型要彙總的數值欄位，與額外的維度欄位
+ROLLUP_METRICS: Dict[str, List[str]] = {
+    'seo_metrics': ['clicks', 'impressions', 'ctr', 'position'],
+    'performance_metrics': [
+        'lighthouse_seo', 'lighthouse_performance', 'lighthouse_accessibility', 'lighthouse_best_practices',
+        'core_web_vitals_lcp', 'core_web_vitals_fid', 'core_web_vitals_cls', 'ttfb', 'page_load_time',
+    ],
+    'ai_search_metrics': ['mentioned', 'position', 'accuracy_score', 'response_quality'],
+}
+ROLLUP_GRANULARITIES = ('hour', 'day')
+
+
+def rollup_buckets(timestamp: datetime) -> Dict[str, str]:
+    return {
+        'hour': timestamp.replace(minute=0, second=0, microsecond=0).isoformat(),
+        'day': timestamp.date().isoformat(),
+    }
+
+
+def rollup_contributions(data_type: str, rows: List[Dict[str, Any]]) -> Dict[tuple, list]:
+    """把原始列彙總為 (粒度, 時間桶, 來源, 維度, 維度值, 指標) -> [count, sum, min, max, 草圖]"""
+    contributions: Dict[tuple, list] = {}
+    
+    def add(key: tuple, value: Any):
+        if value is None:
+            return
+        value = float(value)
+        entry = contributions.get(key)
+        if entry is None:
+            contributions[key] = entry = [0, 0.0, value, value, QuantileSketch()]
+        entry[0] += 1
+        entry[1] += value
+        entry[2] = min(entry[2], value)
+        entry[3] = max(entry[3], value)
+        entry[4].add(value)
+    
+    for row in rows:
+        source = row.get('source') or DEFAULT_PARTITION_SOURCES.get(data_type, '')
+        for granularity, bucket in rollup_buckets(row['timestamp']).items():
+            dimensions = [('', '')]
+            if data_type == 'ai_search_metrics':
+                dimensions.append(('platform', row['platform']))
+            for metric in ROLLUP_METRICS[data_type]:
+                for dimension, dimension_value in dimensions:
+                    add((granularity, bucket, source, dimension, dimension_value, metric), row.get(metric))
+            if data_type == 'seo_metrics':
+                # 裝置僅有流量佔比，依佔比分攤點擊數；頁面清單沒有個別數值，只記錄出現次數
+                devices = dict(row.get('devices') or {})
+                for device, share in devices.items():
+                    if row.get('clicks') is not None:
+                        add((granularity, bucket, source, 'device', device, 'clicks'), row['clicks'] * share / 100)
+                    add((granularity, bucket, source, 'device', device, 'share'), share)
+                for page in row.get('pages') or []:
+                    add((granularity, bucket, source, 'page', page, 'listed'), 1)
+    return contributions
+
+
+class RollupStore:
+    """以 SQLite 保存每小時／每日的預先彙總（count、sum、min、max、分位數草圖），寫入時增量更新"""
+    
+    KEY_COLUMNS = ('granularity', 'bucket', 'data_type', 'source', 'dimension', 'dimension_value', 'metric')
+    
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.engine = sa.create_engine(f"sqlite:///{self.path}")
+        self.metadata = sa.MetaData()
+        self.table = sa.Table(
+            'metric_rollups', self.metadata,
+            *(sa.Column(name, sa.String, primary_key=True) for name in self.KEY_COLUMNS),
+            sa.Column('count', sa.Integer, nullable=False),
+            sa.Column('sum', sa.Float, nullable=False),
+            sa.Column('min', sa.Float, nullable=False),
+            sa.Column('max', sa.Float, nullable=False),
+            sa.Column('sketch', sa.Text),
+        )
+        self.metadata.create_all(self.engine)
+        # 草圖需在 Python 端合併，讀取-合併-寫入期間互斥
+        self._lock = threading.Lock()
+    
+    def _key_filter(self, keys: List[tuple]):
+        return sa.tuple_(*(self.table.c[name] for name in self.KEY_COLUMNS)).in_(keys)
+    
+    def add(self, data_type: str, rows: List[Dict[str, Any]]):
+        """把新附加的原始列累加進對應的時間桶"""
+        contributions = rollup_contributions(data_type, rows)
+        if not contributions:
+            return
+        keyed = {(granularity, bucket, data_type, source, dimension, value, metric): entry
+                 for (granularity, bucket, source, dimension, value, metric), entry in contributions.items()}
+        with self._lock, self.engine.begin() as conn:
+            existing = conn.execute(sa.select(self.table).where(self._key_filter(list(keyed)))).mappings()
+            for row in existing:
+                entry = keyed[tuple(row[name] for name in self.KEY_COLUMNS)]
+                sketch = QuantileSketch.from_json(row['sketch'])
+                sketch.merge(entry[4])
+                keyed[tuple(row[name] for name in self.KEY_COLUMNS)] = [
+                    entry[0] + row['count'], entry[1] + row['sum'],
+                    min(entry[2], row['min']), max(entry[3], row['max']), sketch,
+                ]
+            self._write(conn, keyed)
+    
+    def replace(self, data_type: str, source: str, day: date, rows: List[Dict[str, Any]]):
+        """以分區內的完整數據重算某來源某日的所有時間桶，供 upsert 型數據維持冪等"""
+        contributions = rollup_contributions(data_type, rows)
+        keyed = {(granularity, bucket, data_type, source, dimension, value, metric): entry
+                 for (granularity, bucket, _, dimension, value, metric), entry in contributions.items()}
+        day_start = datetime.combine(day, datetime.min.time())
+        with self._lock, self.engine.begin() as conn:
+            c = self.table.c
+            conn.execute(self.table.delete().where(
+                (c.data_type == data_type) & (c.source == source) & (
+                    ((c.granularity == 'day') & (c.bucket == day.isoformat()))
+                    | ((c.granularity == 'hour') & (c.bucket >= day_start.isoformat())
+                       & (c.bucket < (day_start + timedelta(days=1)).isoformat())))))
+            self._write(conn, keyed)
+    
+    def _write(self, conn, keyed: Dict[tuple, list]):
+        if not keyed:
+            return
+        records = [
+            dict(zip(self.KEY_COLUMNS, key), count=entry[0], sum=entry[1], min=entry[2], max=entry[3],
+                 sketch=entry[4].to_json())
+            for key, entry in keyed.items()
+        ]
+        statement = sqlite_insert(self.table)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=list(self.KEY_COLUMNS),
+            set_={name: statement.excluded[name] for name in ('count', 'sum', 'min', 'max', 'sketch')},
+        ), records)
+    
+    def query(self, data_type: str, metric: str, start: datetime, end: datetime, granularity: str = 'day',
+              source: Optional[str] = None, dimension: str = '', dimension_value: Optional[str] = None,
+              quantiles: tuple = (0.5, 0.75, 0.95)) -> Dict[str, Dict[str, Any]]:
+        """合併範圍內的時間桶，依維度值回傳 count、sum、mean、min、max 與分位數，成本與時間桶數成正比"""
+        c = self.table.c
+        start_bucket, end_bucket = rollup_buckets(start)[granularity], rollup_buckets(end)[granularity]
+        query = sa.select(self.table).where(
+            (c.granularity == granularity) & (c.data_type == data_type) & (c.metric == metric)
+            & (c.dimension == dimension) & (c.bucket >= start_bucket) & (c.bucket <= end_bucket))
+        if source is not None:
+            query = query.where(c.source == source)
+        if dimension_value is not None:
+            query = query.where(c.dimension_value == dimension_value)
+        
+        merged: Dict[str, list] = {}
+        with self.engine.connect() as conn:
+            for row in conn.execute(query).mappings():
+                entry = merged.get(row['dimension_value'])
+                sketch = QuantileSketch.from_json(row['sketch'])
+                if entry is None:
+                    merged[row['dimension_value']] = [row['count'], row['sum'], row['min'], row['max'], sketch]
+                    continue
+                entry[0] += row['count']
+                entry[1] += row['sum']
+                entry[2] = min(entry[2], row['min'])
+                entry[3] = max(entry[3], row['max'])
+                entry[4].merge(sketch)
+        
+        return {
+            value: {
+                'count': count,
+                'sum': total,
+                'mean': total / count if count else None,
+                'min': minimum,
+                'max': maximum,
+                **{f'p{round(q * 100)}': sketch.quantile(q) for q in quantiles},
+            }
+            for value, (count, total, minimum, maximum, sketch) in merged.items()
+        }
+
+
+class PersistenceWriter:
+    """非同步持久化階段 - 有界佇列搭配專用寫入執行緒，批次合併後呼叫 save_data，事件迴圈不被編碼與 I/O 阻塞"""
+    
+    _STOP = object()
+    
+    def __init__(self, save: Callable[[Dict[str, List[Any]], Optional[List[str]]], None],
+                 max_pending: int = 16, batch_size: int = 8, flush_interval: float = 2.0):
+        self.save = save
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'submitted': 0, 'batches': 0, 'records': 0, 'errors': 0, 'last_flush_seconds': None}
+    
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        # 佇列容量以號誌控制：佇列已滿時 submit 會等待，收集端因此自然減速
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._thread = threading.Thread(target=self._run, name='seo-persistence-writer', daemon=True)
+        self._thread.start()
+        return self
+    
+    async def submit(self, data: Dict[str, List[Any]], source: Optional[str] = None):
+        """排入一批數據；佇列已滿時等待寫入執行緒消化"""
+        await self._slots.acquire()
+        self.stats['submitted'] += 1
+        self._queue.put((data, source, None))
+    
+    async def flush(self):
+        """等待目前已排入的數據全部寫入"""
+        done = self._loop.create_future()
+        self._queue.put((None, None, done))
+        await done
+    
+    async def close(self):
+        """寫出剩餘數據並停止寫入執行緒"""
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+    
+    def _release(self, count: int):
+        for _ in range(count):
+            self._slots.release()
+    
+    def _notify(self, future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            # 湊滿 batch_size 或等到 flush_interval 才寫入，減少小檔與重複編碼
+            while True:
+                if item is self._STOP:
+                    stopping = True
+                elif item[2] is not None:
+                    waiters.append(item[2])
+                else:
+                    batch.append(item)
+                if stopping or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if stopping:
+                # 關閉前把佇列中剩餘的數據一併寫出
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not self._STOP and item[2] is None:
+                        batch.append(item)
+                    elif item is not self._STOP:
+                        waiters.append(item[2])
+            if batch:
+                self._write(batch)
+                self._loop.call_soon_threadsafe(self._release, len(batch))
+            for waiter in waiters:
+                self._loop.call_soon_threadsafe(self._notify, waiter)
+    
+    def _write(self, batch: list):
+        merged: Dict[str, List[Any]] = {}
+        sources = []
+        for data, source, _ in batch:
+            for data_type, metrics_list in data.items():
+                merged.setdefault(data_type, []).extend(metrics_list)
+            if source and source not in sources:
+                sources.append(source)
+        started = time.perf_counter()
+        try:
+            self.save(merged, sources)
+        except Exception as e:
+            # 寫入失敗不推進水位線，增量來源下次會重新收集
+            self.stats['errors'] += 1
+            logger.error(f"批次寫入失敗（{len(batch)} 批）: {str(e)}")
+            return
+        self.stats['batches'] += 1
+        self.stats['records'] += sum(len(metrics_list) for metrics_list in merged.values())
+        self.stats['last_flush_seconds'] = round(time.perf_counter() - started, 3)
+
+
+class CollectionPipeline:
+    """串流收集管線：collect → normalize → persist → rollup，各階段以有界 asyncio.Queue 串接，
+    下游較慢時上游自動等待，記憶體用量與佇列長度成正比，寫入可與來源分頁並行
+    
+    persist 階段把同一收集器、同一 (來源, 日期) 的連續分頁合併後才寫入，
+    每個分區與其彙總只重建一次，分頁之間也不會互相取代。
+    """
+    
+    _END = object()
+    
+    def __init__(self, manager: 'SEODataCollectionManager', queue_size: int = 4):
+        self.manager = manager
+        self.queue_size = queue_size
+    
+    @staticmethod
+    def merge_pages(pages: List[Dict[str, List[Any]]]) -> Dict[str, List[Any]]:
+        """合併多頁數據；SEO 指標併為單一欄式批次，upsert 時視為同一代"""
+        merged: Dict[str, List[Any]] = {}
+        for data in pages:
+            for data_type, metrics_list in data.items():
+                merged.setdefault(data_type, []).extend(metrics_list)
+        seo_metrics = merged.get('seo_metrics')
+        if seo_metrics and len(pages) > 1:
+            batch = SEOMetricsBatch()
+            for item in seo_metrics:
+                if isinstance(item, SEOMetricsBatch):
+                    batch.extend(item)
+                else:
+                    batch.append(**item.to_dict())
+            merged['seo_metrics'] = [batch]
+        return merged
+    
+    async def run(self, collectors: List[DataCollectorBase]) -> Dict[str, int]:
+        normalize_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        persist_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        rollup_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        records = {collector.name: 0 for collector in collectors}
+        failed: set = set()
+        
+        async def collect(collector: DataCollectorBase):
+            async def drain() -> int:
+                count = 0
+                async for batch in collector.collect_batches():
+                    count += record_count(batch)
+                    await normalize_queue.put((collector, batch))
+                return count
+            try:
+                records[collector.name] = await collector.timed(drain())
+            except asyncio.TimeoutError:
+                failed.add(collector.name)
+                logger.error(f"{collector.name}: 串流收集逾時（{collector.timeout:g} 秒），已取消")
+            except Exception as e:
+                failed.add(collector.name)
+                logger.error(f"{collector.name}: 串流收集失敗 - {str(e)}")
+            # 收集器結束標記隨數據流過各階段，抵達最後一階段時代表該收集器的數據皆已寫入
+            await normalize_queue.put((collector, self._END))
+        
+        async def normalize():
+            while True:
+                item = await normalize_queue.get()
+                if item is None:
+                    await persist_queue.put(None)
+                    return
+                collector, batch = item
+                await persist_queue.put((collector, batch if batch is self._END
+                                         else self.manager.categorize_data(batch)))
+        
+        # 各收集器尚未寫入的分頁與其涵蓋的 (來源, 日期)
+        pending: Dict[str, List[Dict[str, List[Any]]]] = {}
+        pending_days: Dict[str, set] = {}
+        
+        async def flush(collector: DataCollectorBase):
+            pages = pending.pop(collector.name, [])
+            pending_days.pop(collector.name, None)
+            if not pages:
+                return
+            data = self.merge_pages(pages)
+            if collector.name not in failed:
+                try:
+                    for data_type, metrics_list in data.items():
+                        if metrics_list:
+                            await asyncio.to_thread(self.manager.persist_metrics, data_type, metrics_list)
+                except Exception as e:
+                    failed.add(collector.name)
+                    logger.error(f"{collector.name}: 串流寫入失敗 - {str(e)}")
+            await rollup_queue.put((collector, data))
+        
+        async def persist():
+            while True:
+                item = await persist_queue.get()
+                if item is None:
+                    await rollup_queue.put(None)
+                    return
+                collector, data = item
+                if data is self._END:
+                    await flush(collector)
+                    await rollup_queue.put(item)
+                    continue
+                # 分頁來源需連續產生同一天的各頁；出現新日期時前一組日期已收齊，合併寫入
+                days = metric_partition_keys(data.get('seo_metrics', []))
+                if collector.name in pending and not days & pending_days[collector.name]:
+                    await flush(collector)
+                pending.setdefault(collector.name, []).append(data)
+                pending_days.setdefault(collector.name, set()).update(days)
+        
+        async def rollup():
+            while True:
+                item = await rollup_queue.get()
+                if item is None:
+                    return
+                collector, data = item
+                if data is self._END:
+                    if collector.name in failed:
+                        collector.pending_watermark = None
+                    else:
+                        collector.commit_watermark()
+                    continue
+                if collector.name in failed:
+                    continue
+                try:
+                    for data_type, metrics_list in data.items():
+                        if metrics_list:
+                            await asyncio.to_thread(self.manager.update_rollups, data_type, metrics_list)
+                except Exception as e:
+                    failed.add(collector.name)
+                    logger.error(f"{collector.name}: 彙總更新失敗 - {str(e)}")
+        
+        stages = [asyncio.create_task(stage()) for stage in (normalize, persist, rollup)]
+        try:
+            await asyncio.gather(*(collect(collector) for collector in collectors))
+            await normalize_queue.put(None)
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+        return records
+
+
+@dataclass(order=True)
+class ScheduledRun:
+    """排程佇列中的一次執行，依 next_run 排序"""
+    next_run: float
+    sequence: int
+    collector: DataCollectorBase = field(compare=False)
+
+
+class CollectorScheduler:
+    """收集器排程器 - 以優先佇列維護各收集器的下次執行時間，彼此獨立運行"""
+    
+    def __init__(self, collectors: List[DataCollectorBase],
+                 job: Callable[[DataCollectorBase], Awaitable[int]]):
+        self.collectors = collectors
+        # 執行一次收集並交付數據，回傳筆數
+        self.job = job
+        self._queue: List[ScheduledRun] = []
+        self._sequence = itertools.count()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._running: Dict[str, int] = {}
+        self._tasks: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopped = False
+    
+    def _schedule(self, collector: DataCollectorBase, next_run: float):
+        heapq.heappush(self._queue, ScheduledRun(next_run, next(self._sequence), collector))
+    
+    def _next_run_after(self, collector: DataCollectorBase, due: float, now: float) -> float:
+        # 以固定速率排程，避免執行時間累積漂移；落後時從現在重新起算
+        next_run = due + collector.interval
+        if next_run < now:
+            next_run = now + collector.interval
+        return next_run + random.uniform(0, collector.jitter)
+    
+    async def _run_collector(self, collector: DataCollectorBase):
+        try:
+            async with self._semaphores[collector.name]:
+                records = await self.job(collector)
+                logger.info(f"{collector.name}: 排程收集完成，{records} 筆，耗時 {collector.stats.last_seconds:.2f} 秒")
+        except asyncio.TimeoutError:
+            logger.error(f"{collector.name}: 排程收集逾時（{collector.timeout:g} 秒），已取消")
+        except Exception as e:
+            logger.error(f"{collector.name}: 排程收集失敗 - {str(e)}")
+        finally:
+            self._running[collector.name] -= 1
+    
+    async def run(self):
+        """執行排程直到 stop() 被呼叫"""
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        now = loop.time()
+        for collector in self.collectors:
+            self._semaphores[collector.name] = asyncio.Semaphore(collector.max_concurrency)
+            self._running[collector.name] = 0
+            # 首次執行在 jitter 範圍內錯開，避免所有收集器同時啟動
+            self._schedule(collector, now + random.uniform(0, collector.jitter))
+        
+        try:
+            while not self._stopped and self._queue:
+                delay = self._queue[0].next_run - loop.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                
+                run = heapq.heappop(self._queue)
+                collector = run.collector
+                now = loop.time()
+                if self._running[collector.name] >= collector.max_concurrency:
+                    # 前一次執行尚未結束且已達並行上限，略過本次以免堆積
+                    logger.warning(f"{collector.name}: 已達並行上限 {collector.max_concurrency}，略過本次排程")
+                else:
+                    self._running[collector.name] += 1
+                    task = asyncio.create_task(self._run_collector(collector))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                self._schedule(collector, self._next_run_after(collector, run.next_run, now))
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def stop(self):
+        """停止排程，進行中的收集會被取消"""
+        self._stopped = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def next_runs(self) -> Dict[str, float]:
+        """各收集器距離下次執行的秒數"""
+        now = asyncio.get_running_loop().time()
+        runs: Dict[str, float] = {}
+        for run in sorted(self._queue):
+            runs.setdefault(run.collector.name, max(run.next_run - now, 0.0))
+        return runs
+
+
 class SEODataCollectionManager:
     """SEO 數據收集管理器"""
     
@@ -289,8 +1727,31 @@ class SEODataCollectionManager:
         self.config_path = Path(config_path)
         self.config = self.load_config()
         self.collectors: List[DataCollectorBase] = []
+        self.scheduler: Optional[CollectorScheduler] = None
+        self.writer: Optional[PersistenceWriter] = None
+        self.pipeline: Optional['CollectionPipeline'] = None
+        self.last_collection_report: Dict[str, Any] = {}
         self.data_storage_path = Path('data/seo_metrics')
         self.data_storage_path.mkdir(parents=True, exist_ok=True)
+        # 關鍵字、頁面、裝置與國家的共用維度字典，儀表板與報告讀取同一份檔案
+        self.dimensions = DimensionDictionary(
+            self.config.get('dimension_file', self.data_storage_path / 'dimensions.json'))
+        self.store = PartitionedParquetStore(
+            self.data_storage_path,
+            row_group_size=self.config.get('row_group_size', 64 * 1024),
+            max_rows_per_file=self.config.get('max_rows_per_file', 1024 * 1024),
+            target_file_bytes=self.config.get('compaction_target_bytes', 64 * 1024 * 1024),
+            dimensions=self.dimensions)
+        migrated = self.store.migrate_string_dimensions()
+        if migrated:
+            logger.info(f"已將 {migrated} 個 seo_metrics 分區的維度字串轉為字典編號")
+        self.rollups = RollupStore(
+            self.config.get('rollup_database', self.data_storage_path / 'rollups.sqlite'))
+        self.watermarks = WatermarkStore(
+            self.config.get('watermark_file', self.data_storage_path / 'watermarks.json'))
+        imported = self.import_legacy_files()
+        if imported:
+            logger.info(f"已將 {imported} 個舊版數據檔匯入分區數據集")
         
         self.setup_collectors()
     
@@ -302,24 +1763,29 @@ class SEODataCollectionManager:
                     return json.load(f)
             else:
                 # 預設配置
+                # 各收集器以自身的 interval（秒）排程，寫出預設值方便調整
                 default_config = {
                     'google_search_console': {
                         'service_account_file': 'credentials/gsc_service_account.json',
-                        'site_url': 'https://haotool.github.io/clickfun/'
+                        'site_url': 'https://haotool.github.io/clickfun/',
+                        'interval': GoogleSearchConsoleCollector.default_interval
                     },
                     'google_analytics': {
                         'property_id': 'G-XXXXXXXXXX',
-                        'credentials_path': 'credentials/ga4_credentials.json'
+                        'credentials_path': 'credentials/ga4_credentials.json',
+                        'interval': GoogleAnalyticsCollector.default_interval
                     },
                     'lighthouse': {
                         'target_url': 'https://haotool.github.io/clickfun/',
-                        'api_key': 'YOUR_PAGESPEED_API_KEY'
+                        'api_key': 'YOUR_PAGESPEED_API_KEY',
+                        'interval': LighthouseCollector.default_interval
                     },
                     'ai_search': {
                         'platforms': ['ChatGPT', 'Perplexity', 'Claude', 'Bing Chat'],
-                        'test_queries': ['推薦點擊遊戲', '免費PWA遊戲', 'Click Fun是什麼']
+                        'test_queries': ['推薦點擊遊戲', '免費PWA遊戲', 'Click Fun是什麼'],
+                        'interval': AISearchCollector.default_interval
                     },
-                    'collection_interval': 3600,  # 1 小時
+                    'summary_interval': 3600,  # 1 小時
                     'storage_format': 'parquet'
                 }
                 
@@ -347,6 +1813,8 @@ class SEODataCollectionManager:
                 try:
                     collector = collector_class(self.config[name])
                     if collector.validate_config():
+                        if collector.incremental:
+                            collector.watermarks = self.watermarks
                         self.collectors.append(collector)
                         logger.info(f"已設置收集器: {name}")
                     else:
@@ -355,56 +1823,147 @@ class SEODataCollectionManager:
                     logger.error(f"設置收集器失敗 {name}: {str(e)}")
     
     async def collect_all_data(self) -> Dict[str, List[Any]]:
-        """收集所有數據"""
+        """收集所有數據 - 依完成順序處理結果，各收集器套用自身的逾時限制"""
         all_data = {
             'seo_metrics': [],
             'performance_metrics': [],
             'ai_search_metrics': []
         }
+        report: Dict[str, Dict[str, Any]] = {}
+        started = time.perf_counter()
         
-        collection_tasks = []
-        for collector in self.collectors:
-            task = asyncio.create_task(collector.collect_data())
-            collection_tasks.append((collector.name, task))
-        
-        # 等待所有收集任務完成
-        for collector_name, task in collection_tasks:
+        async def run(collector: DataCollectorBase):
             try:
-                data = await task
-                
-                # 根據數據類型分類存儲
-                for item in data:
-                    if isinstance(item, SEOMetrics):
-                        all_data['seo_metrics'].append(item)
-                    elif isinstance(item, PerformanceMetrics):
-                        all_data['performance_metrics'].append(item)
-                    elif isinstance(item, AISearchMetrics):
-                        all_data['ai_search_metrics'].append(item)
-                        
-                logger.info(f"{collector_name}: 收集完成")
-                
+                return collector, await collector.run_collection(), None
+            except asyncio.TimeoutError:
+                return collector, [], 'timeout'
             except Exception as e:
-                logger.error(f"{collector_name}: 收集失敗 - {str(e)}")
+                return collector, [], str(e)
+        
+        tasks = [asyncio.create_task(run(collector)) for collector in self.collectors]
+        try:
+            # 先完成的收集器先分類，不受較慢或卡住的收集器拖累
+            for next_done in asyncio.as_completed(tasks):
+                collector, data, error = await next_done
+                self.categorize_data(data, all_data)
+                report[collector.name] = {
+                    'status': collector.stats.last_status,
+                    'records': record_count(data),
+                    'seconds': round(collector.stats.last_seconds or 0.0, 3),
+                    'timeouts': collector.stats.timeouts,
+                }
+                if error == 'timeout':
+                    logger.error(f"{collector.name}: 收集逾時（{collector.timeout:g} 秒），已取消")
+                elif error:
+                    logger.error(f"{collector.name}: 收集失敗 - {error}")
+                else:
+                    logger.info(f"{collector.name}: 收集完成，{record_count(data)} 筆，耗時 {collector.stats.last_seconds:.2f} 秒")
+        finally:
+            # 外部取消時一併取消尚未完成的收集
+            for task in tasks:
+                task.cancel()
         
+        self.last_collection_report = {
+            'seconds': round(time.perf_counter() - started, 3),
+            'timeouts': sum(1 for item in report.values() if item['status'] == 'timeout'),
+            # 只有這些收集器的水位線可在 save_data 時提交
+            'succeeded': [name for name, item in report.items() if item['status'] == 'ok'],
+            'collectors': report,
+        }
+        logger.info(f"本輪收集耗時 {self.last_collection_report['seconds']:.2f} 秒，"
+                    f"逾時 {self.last_collection_report['timeouts']} 個收集器")
         return all_data
     
-    def save_data(self, data: Dict[str, List[Any]]):
-        """儲存數據到檔案"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
+    def get_collection_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各收集器累計的執行次數、逾時次數與耗時"""
+        return {collector.name: collector.stats.to_dict() for collector in self.collectors}
+    
+    @staticmethod
+    def categorize_data(data: List[Any], all_data: Optional[Dict[str, List[Any]]] = None) -> Dict[str, List[Any]]:
+        """根據數據類型分類存儲"""
+        if all_data is None:
+            all_data = {
+                'seo_metrics': [],
+                'performance_metrics': [],
+                'ai_search_metrics': []
+            }
+        for item in data:
+            if isinstance(item, (SEOMetrics, SEOMetricsBatch)):
+                all_data['seo_metrics'].append(item)
+            elif isinstance(item, PerformanceMetrics):
+                all_data['performance_metrics'].append(item)
+            elif isinstance(item, AISearchMetrics):
+                all_data['ai_search_metrics'].append(item)
+        return all_data
+    
+    # 每日彙總數據以鍵值 upsert，重複收集同一天（回看區間）不會產生重複列
+    UPSERT_KEYS = {'seo_metrics': ['source', 'site', 'timestamp']}
+    
+    def save_data(self, data: Dict[str, List[Any]], source: Union[str, List[str], None] = None):
+        """儲存數據到分區數據集；只提交 source 指定的收集器（名稱或名稱清單）的水位線，None 時不推進任何水位線"""
         for data_type, metrics_list in data.items():
             if not metrics_list:
                 continue
-                
-            # 轉換為 DataFrame
-            df_data = [metric.to_dict() for metric in metrics_list]
-            df = pd.DataFrame(df_data)
-            
-            # 儲存檔案
-            file_path = self.data_storage_path / f"{data_type}_{timestamp}.parquet"
-            df.to_parquet(file_path, engine='pyarrow', compression='snappy')
-            
-            logger.info(f"已儲存 {len(df)} 筆 {data_type} 數據到 {file_path}")
+            self.persist_metrics(data_type, metrics_list)
+            self.update_rollups(data_type, metrics_list)
+        
+        # 數據落地後才推進水位線，寫入失敗時下次會重新收集同一區間
+        sources = [source] if isinstance(source, str) else (source or [])
+        for collector in self.collectors:
+            if collector.name in sources:
+                collector.commit_watermark()
+    
+    def import_legacy_files(self) -> int:
+        """一次性匯入：把舊版寫在根目錄的 {data_type}_{時間}.parquet 寫入分區數據集並更新彙總，
+        完成的檔案移到 legacy_imported/，回傳匯入的檔案數"""
+        imported = 0
+        for path in sorted(self.data_storage_path.glob('*_*.parquet')):
+            data_type = next((name for name in LEGACY_METRIC_CLASSES if path.name.startswith(f"{name}_")), None)
+            if data_type is None:
+                continue
+            try:
+                self.save_data({data_type: legacy_metrics(data_type, pq.read_table(path))})
+            except (OSError, ValueError, TypeError, pa.ArrowException) as e:
+                logger.error(f"匯入舊版數據檔失敗 {path}: {str(e)}")
+                continue
+            target = self.data_storage_path / 'legacy_imported' / path.name
+            target.parent.mkdir(exist_ok=True)
+            os.replace(path, target)
+            imported += 1
+        return imported
+    
+    def persist_metrics(self, data_type: str, metrics_list: List[Any]):
+        """寫入分區數據集：每日彙總型數據 upsert，其餘附加"""
+        if data_type in self.UPSERT_KEYS:
+            count = self.store.upsert(data_type, metrics_list, self.UPSERT_KEYS[data_type])
+            logger.info(f"已 upsert {count} 筆 {data_type} 數據")
+        else:
+            count = self.store.append(data_type, metrics_list)
+            logger.info(f"已附加 {count} 筆 {data_type} 數據")
+    
+    def update_rollups(self, data_type: str, metrics_list: List[Any]):
+        """更新預先彙總表；需在 persist_metrics 之後呼叫"""
+        if data_type in self.UPSERT_KEYS:
+            # upsert 可能取代既有列，受影響的日期改以分區完整數據重算彙總
+            for source_name, day in sorted(metric_partition_keys(metrics_list)):
+                table = self.store.read(data_type, day, day, sources=[source_name])
+                rows = decode_dimensions(table, self.dimensions).to_pylist()
+                self.rollups.replace(data_type, source_name, day, rows)
+        else:
+            self.rollups.add(data_type, metric_rows(metrics_list))
+    
+    async def stream_collection(self, collectors: Optional[List[DataCollectorBase]] = None) -> Dict[str, int]:
+        """以串流管線收集並寫入數據，回傳各收集器寫入的筆數"""
+        if self.pipeline is None:
+            self.pipeline = CollectionPipeline(self, queue_size=self.config.get('pipeline_queue_size', 4))
+        return await self.pipeline.run(collectors if collectors is not None else self.collectors)
+    
+    def query_rollups(self, data_type: str, metric: str, days: int = 7, granularity: str = 'day',
+                      **filters: Any) -> Dict[str, Dict[str, Any]]:
+        """從預先彙總表查詢最近 days 天的指標統計，不掃描原始數據"""
+        end_date = datetime.now()
+        return self.rollups.query(data_type, metric, end_date - timedelta(days=days), end_date,
+                                  granularity=granularity, **filters)
     
     def get_data_summary(self, days: int = 7) -> Dict[str, Any]:
         """獲取數據摘要"""
@@ -420,62 +1979,218 @@ class SEODataCollectionManager:
         
         return summary
     
+    def scan_metrics(self, data_type: str, start_date: datetime, end_date: datetime, columns: List[str],
+                     sources: Optional[List[str]] = None) -> pa.Table:
+        """讀取時間範圍內的指標：日期分區裁剪、timestamp 謂詞下推，只讀取需要的欄位"""
+        timestamp = ds.field('timestamp')
+        predicate = ((timestamp >= pa.scalar(start_date, pa.timestamp('us')))
+                     & (timestamp <= pa.scalar(end_date, pa.timestamp('us'))))
+        return self.store.read(data_type, start_date.date(), end_date.date(),
+                               columns=columns, filter=predicate, sources=sources)
+    
+    @staticmethod
+    def _scalar(value: pa.Scalar, digits: int = 4) -> Optional[Union[int, float]]:
+        value = value.as_py()
+        return round(value, digits) if isinstance(value, float) else value
+    
+    @staticmethod
+    def _trend(table: pa.Table, column: str, threshold: float = 0.05) -> str:
+        """比較期間前後兩半的每日平均值判斷趨勢"""
+        daily = table.group_by('date').aggregate([(column, 'sum')]).sort_by('date')
+        if len(daily) < 2:
+            return 'insufficient_data'
+        values = daily[f'{column}_sum']
+        half = len(daily) // 2
+        before = pc.mean(values.slice(0, half)).as_py() or 0
+        after = pc.mean(values.slice(len(daily) - half)).as_py() or 0
+        if before == 0:
+            return 'increasing' if after > 0 else 'stable'
+        change = (after - before) / before
+        if change > threshold:
+            return 'increasing'
+        if change < -threshold:
+            return 'decreasing'
+        return 'stable'
+    
     def analyze_seo_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """分析 SEO 指標"""
-        # 這裡可以載入歷史數據進行分析
-        # 目前返回模擬分析結果
+        """分析 SEO 指標 - 搜尋表現以 GSC 數據計算，點擊另依來源分列"""
+        # 各來源只讀取點擊數；裝置、國家等較大的欄位只從 GSC 的分區讀取
+        table = self.scan_metrics('seo_metrics', start_date, end_date, ['source', 'clicks'])
+        if len(table) == 0:
+            return {'records': 0}
+        
+        search = self.scan_metrics('seo_metrics', start_date, end_date,
+                                   ['date', 'clicks', 'impressions', 'position', 'devices', 'countries'],
+                                   sources=['google_search_console'])
+        total_clicks = pc.sum(search['clicks']).as_py() or 0
+        total_impressions = pc.sum(search['impressions']).as_py() or 0
+        # CTR 與排名以曝光數加權，避免低流量日拉偏平均
+        weighted_position = pc.sum(pc.multiply(search['position'], pc.cast(search['impressions'], pa.float64())))
+        by_source = table.group_by('source').aggregate([('clicks', 'sum')])
         return {
-            'total_clicks': np.random.randint(800, 1200),
-            'total_impressions': np.random.randint(8000, 12000),
-            'average_ctr': np.random.uniform(0.08, 0.12),
-            'average_position': np.random.uniform(4, 8),
-            'trend': 'increasing'
+            'records': len(table),
+            'total_clicks': total_clicks,
+            'total_impressions': total_impressions,
+            'average_ctr': round(total_clicks / total_impressions, 4) if total_impressions else None,
+            'average_position': (round(weighted_position.as_py() / total_impressions, 2)
+                                 if total_impressions else None),
+            'clicks_by_source': dict(zip(by_source['source'].to_pylist(), by_source['clicks_sum'].to_pylist())),
+            'clicks_by_device': self._clicks_by_dimension(search, 'devices'),
+            'clicks_by_country': self._clicks_by_dimension(search, 'countries'),
+            'trend': self._trend(search, 'clicks') if len(search) else 'insufficient_data'
         }
     
+    def _clicks_by_dimension(self, table: pa.Table, column: str) -> Dict[str, float]:
+        """依裝置／國家的流量佔比分攤點擊數；以 int32 編號分組加總，最後才還原為字串"""
+        entries = map_entries(table[column])
+        if len(entries) == 0:
+            return {}
+        clicks = pc.cast(table['clicks'].take(entries['row_index']), pa.float64())
+        shares = pa.table({
+            'key': entries['key'],
+            'clicks': pc.divide(pc.multiply(clicks, pc.cast(entries['value'], pa.float64())), 100.0),
+        })
+        grouped = shares.group_by('key').aggregate([('clicks', 'sum')]).sort_by([('clicks_sum', 'descending')])
+        kind = DIMENSION_FIELDS[column]
+        return {self.dimensions.decode(kind, code): round(total, 2)
+                for code, total in zip(grouped['key'].to_pylist(), grouped['clicks_sum'].to_pylist())
+                if total is not None}
+    
+    # Core Web Vitals 門檻（良好, 需要改善），以 p75 判定
+    CORE_WEB_VITALS_THRESHOLDS = {
+        'core_web_vitals_lcp': (2.5, 4.0),
+        'core_web_vitals_fid': (100, 300),
+        'core_web_vitals_cls': (0.1, 0.25),
+    }
+    
     def analyze_performance_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """分析效能指標"""
+        table = self.scan_metrics('performance_metrics', start_date, end_date,
+                                  ['lighthouse_seo', 'lighthouse_performance'] + list(self.CORE_WEB_VITALS_THRESHOLDS))
+        if len(table) == 0:
+            return {'records': 0}
+        
+        status = 'good'
+        p75 = {}
+        for column, (good, needs_improvement) in self.CORE_WEB_VITALS_THRESHOLDS.items():
+            value = pc.quantile(table[column], q=0.75)[0].as_py()
+            p75[column] = value
+            if value is None:
+                continue
+            if value > needs_improvement:
+                status = 'poor'
+            elif value > good and status == 'good':
+                status = 'needs_improvement'
         return {
-            'lighthouse_seo_avg': 100,
-            'lighthouse_performance_avg': np.random.randint(92, 98),
-            'core_web_vitals_status': 'good',
-            'lcp_avg': np.random.uniform(1.3, 1.8),
-            'cls_avg': np.random.uniform(0.06, 0.09)
+            'records': len(table),
+            'lighthouse_seo_avg': self._scalar(pc.mean(table['lighthouse_seo']), 1),
+            'lighthouse_performance_avg': self._scalar(pc.mean(table['lighthouse_performance']), 1),
+            'core_web_vitals_status': status,
+            'lcp_avg': self._scalar(pc.mean(table['core_web_vitals_lcp']), 3),
+            'lcp_p75': round(p75['core_web_vitals_lcp'], 3) if p75['core_web_vitals_lcp'] is not None else None,
+            'cls_avg': self._scalar(pc.mean(table['core_web_vitals_cls'])),
+            'cls_p75': round(p75['core_web_vitals_cls'], 4) if p75['core_web_vitals_cls'] is not None else None
         }
     
     def analyze_ai_search_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """分析 AI 搜尋指標"""
+        table = self.scan_metrics('ai_search_metrics', start_date, end_date,
+                                  ['platform', 'mentioned', 'position', 'accuracy_score'])
+        if len(table) == 0:
+            return {'records': 0}
+        
+        mentioned = table.filter(table['mentioned'])
+        by_platform = table.group_by('platform').aggregate([('mentioned', 'mean')])
         return {
-            'mention_rate': np.random.uniform(0.65, 0.85),
-            'average_position': np.random.uniform(2, 4),
-            'platforms_covered': ['ChatGPT', 'Perplexity', 'Claude', 'Bing Chat'],
-            'accuracy_score_avg': np.random.uniform(0.8, 0.92)
+            'records': len(table),
+            'mention_rate': self._scalar(pc.mean(pc.cast(table['mentioned'], pa.float64()))),
+            'average_position': self._scalar(pc.mean(mentioned['position']), 2),
+            'platforms_covered': sorted(pc.unique(mentioned['platform']).to_pylist()),
+            'mention_rate_by_platform': {
+                platform: round(rate, 4) for platform, rate in
+                zip(by_platform['platform'].to_pylist(), by_platform['mentioned_mean'].to_pylist())
+            },
+            'accuracy_score_avg': self._scalar(pc.mean(mentioned['accuracy_score']))
         }
     
     async def run_continuous_collection(self):
-        """持續數據收集"""
-        collection_interval = self.config.get('collection_interval', 3600)
+        """持續數據收集 - 各收集器依自身排程獨立執行"""
+        # 摘要改為獨立週期，不再於每次收集後執行
+        summary_interval = self.config.get('summary_interval', 3600)
+        if 'collection_interval' in self.config:
+            logger.warning("collection_interval 已不再使用：請改在各收集器配置中設定 interval，"
+                           "摘要頻率由 summary_interval 控制")
+        
+        for collector in self.collectors:
+            logger.info(f"{collector.name}: 間隔 {collector.interval:.0f} 秒，抖動 {collector.jitter:.0f} 秒，"
+                        f"並行上限 {collector.max_concurrency}")
+        
+        # 編碼與寫入在專用執行緒進行，收集端只在佇列滿時等待
+        self.writer = PersistenceWriter(
+            self.save_data,
+            max_pending=self.config.get('writer_max_pending', 16),
+            batch_size=self.config.get('writer_batch_size', 8),
+            flush_interval=self.config.get('writer_flush_interval', 2.0)).start()
         
-        logger.info(f"開始持續數據收集，間隔: {collection_interval} 秒")
+        async def collect(collector: DataCollectorBase) -> int:
+            if collector.streaming:
+                # 大量分頁的來源邊抓邊寫，記憶體用量受管線佇列限制
+                return (await self.stream_collection([collector]))[collector.name]
+            data = await collector.run_collection()
+            await self.writer.submit(self.categorize_data(data), collector.name)
+            return record_count(data)
         
+        self.scheduler = CollectorScheduler(self.collectors, collect)
+        background_tasks = [
+            asyncio.create_task(self._summary_loop(summary_interval)),
+            asyncio.create_task(self._compaction_loop(self.config.get('compaction_interval', 3600))),
+        ]
+        try:
+            await self.scheduler.run()
+        except KeyboardInterrupt:
+            logger.info("收到中斷信號，停止數據收集")
+        except asyncio.CancelledError:
+            # 寫出佇列後仍把取消傳給呼叫端（見 finally）
+            logger.info("收集工作被取消，停止數據收集")
+            raise
+        finally:
+            self.scheduler.stop()
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            # 關閉前寫出佇列中所有數據
+            await self.writer.close()
+            logger.info(f"持久化統計: {self.writer.stats}")
+    
+    def compact_data(self, data_type: Optional[str] = None) -> Dict[str, int]:
+        """合併分區內的小檔並去重"""
+        started = time.perf_counter()
+        totals = self.store.compact(data_type)
+        if totals['partitions']:
+            logger.info(f"壓實 {totals['partitions']} 個分區：{totals['files_before']} → {totals['files_after']} 個檔案，"
+                        f"移除 {totals['rows_before'] - totals['rows_after']} 筆重複數據，"
+                        f"耗時 {time.perf_counter() - started:.2f} 秒")
+        return totals
+    
+    async def _compaction_loop(self, interval: float):
+        """定期在工作執行緒中壓實數據集，不阻塞收集排程"""
         while True:
+            await asyncio.sleep(interval)
             try:
-                logger.info("開始新一輪數據收集")
-                data = await self.collect_all_data()
-                self.save_data(data)
-                
-                # 生成數據摘要
-                summary = self.get_data_summary()
-                logger.info(f"數據收集完成 - 摘要: {summary}")
-                
-                # 等待下一次收集
-                await asyncio.sleep(collection_interval)
-                
-            except KeyboardInterrupt:
-                logger.info("收到中斷信號，停止數據收集")
-                break
+                await asyncio.to_thread(self.compact_data)
+            except Exception as e:
+                logger.error(f"壓實數據失敗: {str(e)}")
+    
+    async def _summary_loop(self, interval: float):
+        """定期生成數據摘要；先等佇列中的數據寫入，再於工作執行緒中掃描數據集，不阻塞收集排程"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.writer.flush()
+                summary = await asyncio.to_thread(self.get_data_summary)
+                logger.info(f"數據摘要: {summary}")
             except Exception as e:
-                logger.error(f"數據收集循環錯誤: {str(e)}")
-                await asyncio.sleep(60)  # 錯誤時等待 1 分鐘後重試
+                logger.error(f"生成數據摘要失敗: {str(e)}")
 
 
 # 使用範例
@@ -486,7 +2201,7 @@ async def main():
     
     # 執行單次數據收集
     data = await manager.collect_all_data()
-    manager.save_data(data)
+    manager.save_data(data, manager.last_collection_report['succeeded'])
     
     # 獲取數據摘要
     summary = manager.get_data_summary()
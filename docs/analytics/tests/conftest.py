@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+SEO 數據平台測試共用設定
+
+與 README 的使用方式相同，從 docs/analytics 匯入 monitoring.* 模組。
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitoring.seo_data_collector import PartitionedParquetStore  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    # 小檔案門檻，少量數據即可觸發壓實
+    return PartitionedParquetStore(tmp_path / 'seo_metrics', target_file_bytes=1024 * 1024)
+
+
+@pytest.fixture
+def manager_factory(tmp_path, monkeypatch):
+    """在暫存目錄建立管理器；數據寫在 tmp_path/data/seo_metrics，可重複建立以模擬重新啟動"""
+    from monitoring.seo_data_collector import SEODataCollectionManager
+
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / 'config.json'
+
+    def create(config=None):
+        config_path.write_text(json.dumps(config or {}), encoding='utf-8')
+        return SEODataCollectionManager(str(config_path))
+
+    return create
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""串流收集管線、逾時與取消：數據寫入、重複收集與水位線"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from monitoring.seo_data_collector import (GoogleSearchConsoleCollector, LighthouseCollector,
+                                           PerformanceMetrics, SEOMetricsBatch)
+
+SITE = 'https://example.com/'
+
+
+class PagedCollector(GoogleSearchConsoleCollector):
+    """每天產生固定的多頁數據；stall_after 頁之後停住，用來觸發逾時與取消"""
+
+    def __init__(self, config, pages_per_day=3, stall_after=None):
+        super().__init__({'service_account_file': 'unused', 'site_url': SITE, 'jitter': 0, **config})
+        self.pages_per_day = pages_per_day
+        self.stall_after = stall_after
+
+    async def collect_batches(self):
+        produced = 0
+        for day in self.collection_window():
+            for page in range(self.pages_per_day):
+                if self.stall_after is not None and produced >= self.stall_after:
+                    await asyncio.sleep(3600)
+                batch = SEOMetricsBatch()
+                batch.append(timestamp=datetime.combine(day, datetime.min.time()), source='google_search_console',
+                             site=SITE, clicks=10 + page, keywords=[f'kw-{page}'], devices={'desktop': 100})
+                produced += 1
+                yield [batch]
+                await asyncio.sleep(0)
+
+
+class FixedLighthouseCollector(LighthouseCollector):
+    """立即回傳一筆效能數據"""
+
+    async def collect_data(self):
+        return [PerformanceMetrics(timestamp=datetime.now(), source='lighthouse', lighthouse_seo=95)]
+
+
+def add_collector(manager, collector):
+    if collector.incremental:
+        collector.watermarks = manager.watermarks
+    manager.collectors.append(collector)
+    return collector
+
+
+def clicks_by_day(manager, days):
+    table = manager.store.read('seo_metrics', days[0], days[-1], columns=['date', 'clicks'])
+    result = {}
+    for row in table.to_pylist():
+        result.setdefault(row['date'], []).append(row['clicks'])
+    return {day: sorted(clicks) for day, clicks in result.items()}
+
+
+def test_pages_of_a_day_are_merged_and_recollection_is_idempotent(manager_factory):
+    manager = manager_factory()
+    collector = add_collector(manager, PagedCollector({'backfill_days': 3, 'lookback_days': 3}))
+    yesterday = date.today() - timedelta(days=1)
+    days = [yesterday - timedelta(days=offset) for offset in (2, 1, 0)]
+
+    records = asyncio.run(manager.stream_collection([collector]))
+
+    assert records == {collector.name: 9}
+    expected = {day.isoformat(): [10, 11, 12] for day in days}
+    assert clicks_by_day(manager, days) == expected
+    assert manager.watermarks.get(collector.name, SITE) == yesterday
+
+    # 回看區間涵蓋同樣三天，重複收集不會產生重複列
+    asyncio.run(manager.stream_collection([collector]))
+    assert clicks_by_day(manager, days) == expected
+    daily = manager.query_rollups('seo_metrics', 'clicks', days=5)
+    assert sum(stats['count'] for stats in daily.values()) == 9
+
+
+def test_timeout_keeps_watermark(manager_factory):
+    manager = manager_factory()
+    collector = add_collector(manager, PagedCollector({'backfill_days': 3, 'timeout': 0.2}, stall_after=4))
+
+    asyncio.run(manager.stream_collection([collector]))
+
+    assert collector.stats.last_status == 'timeout'
+    assert collector.pending_watermark is None
+    assert manager.watermarks.get(collector.name, SITE) is None
+
+
+def test_cancelling_continuous_collection_flushes_writer(manager_factory):
+    manager = manager_factory({'writer_flush_interval': 60, 'summary_interval': 3600})
+    lighthouse = add_collector(manager, FixedLighthouseCollector(
+        {'target_url': SITE, 'api_key': 'unused', 'interval': 3600, 'jitter': 0}))
+    stalled = add_collector(manager, PagedCollector({'backfill_days': 1, 'interval': 3600}, stall_after=1))
+
+    async def run():
+        task = asyncio.create_task(manager.run_continuous_collection())
+        while lighthouse.stats.runs == 0 or manager.writer.stats['submitted'] == 0:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    # 佇列中尚未寫出的數據在關閉寫入執行緒前寫出；被取消的增量收集不推進水位線
+    assert manager.writer.stats['records'] == 1
+    today = date.today()
+    assert len(manager.store.read('performance_metrics', today, today)) == 1
+    assert stalled.stats.last_status == 'cancelled'
+    assert manager.watermarks.get(stalled.name, SITE) is None
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""舊版根目錄 Parquet 檔的一次性匯入"""
+
+import math
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from monitoring.seo_data_collector import decode_dimensions
+
+DAY = date(2026, 10, 10)
+
+
+def write_legacy_files(root):
+    # 與舊版 pandas 寫出的結構相同：缺值為 NaN、裝置／國家為 struct
+    root.mkdir(parents=True, exist_ok=True)
+    seo = pa.Table.from_pylist([
+        {'timestamp': datetime(2026, 10, 10, 8), 'source': 'google_search_console', 'clicks': 150.0,
+         'impressions': 2500.0, 'ctr': 0.06, 'position': 8.5, 'keywords': ['點擊遊戲', 'Click Fun'],
+         'pages': ['/index.html'], 'devices': {'desktop': 60, 'mobile': 40}, 'countries': {'TW': 100, 'US': None},
+         'site': 'https://example.com/'},
+        {'timestamp': datetime(2026, 10, 10, 9), 'source': 'google_search_console', 'clicks': math.nan,
+         'impressions': 100.0, 'ctr': None, 'position': None, 'keywords': None, 'pages': None,
+         'devices': None, 'countries': None, 'site': 'https://example.com/'},
+    ])
+    seo = seo.set_column(0, 'timestamp', seo['timestamp'].cast(pa.timestamp('ns')))
+    pq.write_table(seo, root / 'seo_metrics_20261010_090000.parquet')
+    performance = pa.Table.from_pylist([
+        {'timestamp': datetime(2026, 10, 10, 9), 'source': 'lighthouse', 'lighthouse_seo': 95.0,
+         'lighthouse_performance': math.nan, 'ttfb': 120.0},
+    ])
+    pq.write_table(performance, root / 'performance_metrics_20261010_090000.parquet')
+
+
+def test_legacy_files_are_imported_once(manager_factory, tmp_path):
+    root = tmp_path / 'data' / 'seo_metrics'
+    write_legacy_files(root)
+
+    manager = manager_factory()
+
+    seo = decode_dimensions(manager.store.read('seo_metrics', DAY, DAY), manager.dimensions)
+    rows = sorted(seo.to_pylist(), key=lambda row: row['timestamp'])
+    assert [row['clicks'] for row in rows] == [150, None]
+    assert rows[0]['keywords'] == ['點擊遊戲', 'Click Fun']
+    assert dict(rows[0]['devices']) == {'desktop': 60, 'mobile': 40}
+    assert dict(rows[0]['countries']) == {'TW': 100}
+    performance = manager.store.read('performance_metrics', DAY, DAY).to_pylist()
+    assert performance[0]['lighthouse_seo'] == 95
+    assert performance[0]['lighthouse_performance'] is None
+    assert sorted(path.name for path in (root / 'legacy_imported').iterdir()) == [
+        'performance_metrics_20261010_090000.parquet', 'seo_metrics_20261010_090000.parquet']
+    assert not list(root.glob('*.parquet'))
+    assert manager.query_rollups('seo_metrics', 'clicks', days=36500)
+
+    # 重新啟動不會再次匯入
+    manager = manager_factory()
+    assert len(manager.store.read('seo_metrics', DAY, DAY)) == 2
+    assert len(manager.store.read('performance_metrics', DAY, DAY)) == 1
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""PartitionedParquetStore：附加、壓實與讀取端的一致性"""
+
+import threading
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from monitoring.seo_data_collector import (PerformanceMetrics, SEODataCollectionManager, SEOMetrics,
+                                           SEOMetricsBatch, decode_dimensions)
+
+DAY = date(2026, 10, 10)
+UPSERT_KEYS = SEODataCollectionManager.UPSERT_KEYS['seo_metrics']
+
+
+def performance_rows(start: int, count: int):
+    base = datetime.combine(DAY, datetime.min.time())
+    return [PerformanceMetrics(timestamp=base + timedelta(seconds=start + i), source='lighthouse',
+                               lighthouse_seo=90, ttfb=float(i))
+            for i in range(count)]
+
+
+def test_compaction_merges_small_files(store):
+    for batch in range(5):
+        store.append('performance_metrics', performance_rows(batch * 10, 10))
+    partition_dir = store.partition_dir('performance_metrics', 'lighthouse', DAY.isoformat())
+    assert len(store.partition_files(partition_dir)) == 5
+
+    result = store.compact_partition(partition_dir)
+
+    assert result == {'files_before': 5, 'files_after': 1, 'rows_before': 50, 'rows_after': 50}
+    assert len(store.partition_files(partition_dir)) == 1
+    assert len(store.read('performance_metrics', DAY, DAY)) == 50
+
+
+def test_compaction_drops_duplicate_appends(store):
+    store.append('performance_metrics', performance_rows(0, 10))
+    store.append('performance_metrics', performance_rows(0, 10))
+    partition_dir = store.partition_dir('performance_metrics', 'lighthouse', DAY.isoformat())
+
+    result = store.compact_partition(partition_dir)
+
+    assert result['rows_after'] == 10
+    assert len(store.read('performance_metrics', DAY, DAY)) == 10
+
+
+def test_reads_during_compaction_see_whole_partitions(store):
+    """壓實與附加持續進行時，讀取不會失敗，也不會同時讀到新舊檔案而重複計算"""
+    partition_dir = store.partition_dir('performance_metrics', 'lighthouse', DAY.isoformat())
+    # started 在附加前遞增、published 在附加後遞增，讀到的列數必介於兩者之間
+    started, published = [0], [0]
+    done = threading.Event()
+    errors = []
+
+    def write():
+        try:
+            for batch in range(30):
+                started[0] += 10
+                store.append('performance_metrics', performance_rows(batch * 10, 10))
+                published[0] += 10
+                store.compact_partition(partition_dir)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    reads = 0
+    while not done.is_set() or reads == 0:
+        before = published[0]
+        rows = len(store.read('performance_metrics', DAY, DAY, columns=['timestamp']))
+        after = started[0]
+        assert before <= rows <= after
+        reads += 1
+    writer.join()
+
+    assert not errors
+    assert len(store.read('performance_metrics', DAY, DAY)) == 300
+
+
+def test_reads_during_upsert_never_double_count(store):
+    """重複 upsert 同一天時，讀取端一律看到完整且不重複的分區"""
+    base = datetime.combine(DAY, datetime.min.time())
+    metrics = [SEOMetrics(timestamp=base + timedelta(hours=hour), source='google_search_console',
+                          clicks=hour, keywords=['點擊遊戲'], site='https://example.com/')
+               for hour in range(10)]
+    store.upsert('seo_metrics', metrics, UPSERT_KEYS)
+    done = threading.Event()
+    errors = []
+
+    def write():
+        try:
+            for _ in range(30):
+                store.upsert('seo_metrics', metrics, UPSERT_KEYS)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while not done.is_set():
+        assert len(store.read('seo_metrics', DAY, DAY, columns=['timestamp'])) == 10
+    writer.join()
+
+    assert not errors
+
+
+def seo_batch(clicks, hours=range(3), keywords=('點擊遊戲',)):
+    batch = SEOMetricsBatch()
+    base = datetime.combine(DAY, datetime.min.time())
+    for hour in hours:
+        batch.append(timestamp=base + timedelta(hours=hour), source='google_search_console',
+                     site='https://example.com/', clicks=clicks, keywords=list(keywords),
+                     devices={'desktop': 100})
+    return batch
+
+
+def read_seo(store):
+    table = store.read('seo_metrics', DAY, DAY)
+    return sorted(decode_dimensions(table, store.dimensions).select(['timestamp', 'clicks', 'keywords']).to_pylist(),
+                  key=lambda row: (row['timestamp'], row['clicks']))
+
+
+def test_upsert_is_idempotent(store):
+    store.upsert('seo_metrics', [seo_batch(10)], UPSERT_KEYS)
+    first = read_seo(store)
+    store.upsert('seo_metrics', [seo_batch(10)], UPSERT_KEYS)
+
+    assert read_seo(store) == first
+    assert len(first) == 3
+
+
+def test_upsert_replaces_keys_with_latest_generation(store):
+    store.upsert('seo_metrics', [seo_batch(10)], UPSERT_KEYS)
+    # 同一批內同鍵值的多列（同一天的多頁）全部保留；較新的批次整批取代舊數據
+    page = seo_batch(20, hours=[0, 0], keywords=('Click Fun',))
+    store.upsert('seo_metrics', [page, seo_batch(30, hours=[1])], UPSERT_KEYS)
+
+    rows = read_seo(store)
+
+    assert [(row['timestamp'].hour, row['clicks']) for row in rows] == [(0, 20), (0, 20), (1, 30), (2, 10)]
+    assert rows[0]['keywords'] == ['Click Fun']
+
+
+def test_compaction_keeps_upserted_rows(store):
+    store.upsert('seo_metrics', [seo_batch(20, hours=[0, 0])], UPSERT_KEYS)
+    store.upsert('seo_metrics', [seo_batch(10, hours=[1])], UPSERT_KEYS)
+    store.append('seo_metrics', [seo_batch(10, hours=[2])])
+    partition_dir = store.partition_dir('seo_metrics', 'google_search_console', DAY.isoformat())
+    before = read_seo(store)
+
+    result = store.compact_partition(partition_dir)
+
+    assert result['rows_before'] == result['rows_after'] == 4
+    assert len(store.partition_files(partition_dir)) == 1
+    assert read_seo(store) == before
+
+
+def test_migrate_string_dimensions(store):
+    """user-024 之前以字串保存維度值的分區改寫為字典編號，且只執行一次"""
+    legacy_schema = pa.schema([
+        ('timestamp', pa.timestamp('us')), ('clicks', pa.int64()), ('impressions', pa.int64()),
+        ('ctr', pa.float64()), ('position', pa.float64()),
+        ('keywords', pa.list_(pa.string())), ('pages', pa.list_(pa.string())),
+        ('devices', pa.map_(pa.string(), pa.int64())), ('countries', pa.map_(pa.string(), pa.int64())),
+        ('site', pa.string()),
+    ])
+    partition_dir = store.partition_dir('seo_metrics', 'google_search_console', DAY.isoformat())
+    partition_dir.mkdir(parents=True)
+    pq.write_table(pa.Table.from_pylist([
+        {'timestamp': datetime(2026, 10, 10), 'clicks': 10, 'keywords': ['舊關鍵字', 'Click Fun'],
+         'devices': [('desktop', 70), ('watch', 30)], 'site': 's'},
+        {'timestamp': datetime(2026, 10, 10, 1), 'clicks': 5, 'pages': ['/old'], 'site': 's'},
+    ], schema=legacy_schema), partition_dir / 'part-legacy-0.parquet')
+
+    assert store.migrate_string_dimensions() == 1
+
+    table = store.read('seo_metrics', DAY, DAY)
+    assert table.schema.field('keywords').type == pa.list_(pa.int32())
+    rows = decode_dimensions(table, store.dimensions).select(['clicks', 'keywords', 'pages', 'devices']).to_pylist()
+    assert rows == [
+        {'clicks': 10, 'keywords': ['舊關鍵字', 'Click Fun'], 'pages': None, 'devices': [('desktop', 70), ('watch', 30)]},
+        {'clicks': 5, 'keywords': None, 'pages': ['/old'], 'devices': None},
+    ]
+    assert store.migrate_string_dimensions() == 0
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""SEOMetricsBatch 與維度字典：欄式批次轉 Arrow 再還原"""
+
+from datetime import date, datetime
+
+from monitoring.dimension_dictionary import DimensionDictionary
+from monitoring.seo_data_collector import METRICS_SCHEMAS, SEOMetricsBatch, decode_dimensions
+
+ROWS = [
+    {'timestamp': datetime(2026, 10, 10), 'source': 'google_search_console', 'site': 'https://example.com/',
+     'clicks': 150, 'impressions': 2500, 'ctr': 0.06, 'position': 8.5,
+     'keywords': ['點擊遊戲', 'Click Fun'], 'pages': ['/index.html'],
+     'devices': {'desktop': 60, 'mobile': 40}, 'countries': {'TW': 100}},
+    {'timestamp': datetime(2026, 10, 10, 1), 'source': 'google_search_console', 'site': None,
+     'clicks': None, 'impressions': 10, 'ctr': None, 'position': None,
+     'keywords': None, 'pages': [], 'devices': None, 'countries': {}},
+    {'timestamp': datetime(2026, 10, 11), 'source': 'google_analytics', 'site': 'https://example.com/',
+     'clicks': 7, 'impressions': None, 'ctr': None, 'position': 2.0,
+     'keywords': ['Click Fun'], 'pages': None, 'devices': {'mobile': 100}, 'countries': None},
+]
+
+
+def make_batch(rows=ROWS, dimensions=None) -> SEOMetricsBatch:
+    batch = SEOMetricsBatch(dimensions)
+    for row in rows:
+        batch.append(**row)
+    return batch
+
+
+def decoded_rows(table, dimensions):
+    rows = decode_dimensions(table, dimensions).to_pylist()
+    for row in rows:
+        for name in ('devices', 'countries'):
+            if row[name] is not None:
+                row[name] = dict(row[name])
+    return rows
+
+
+def test_to_arrow_round_trip():
+    batch = make_batch()
+    table = batch.to_arrow()
+
+    assert table.schema == METRICS_SCHEMAS['seo_metrics']
+    assert len(batch) == len(table) == 3
+    assert decoded_rows(table, batch.dimensions) == ROWS
+
+
+def test_to_arrow_remaps_to_store_dictionary():
+    store_dimensions = DimensionDictionary()
+    store_dimensions.encode('keyword', 'existing')
+    batch = make_batch()
+
+    table = batch.to_arrow(store_dimensions)
+
+    assert decoded_rows(table, store_dimensions) == ROWS
+    assert store_dimensions.lookup('keyword', 'existing') == 0
+    assert store_dimensions.lookup('keyword', '點擊遊戲') is not None
+
+
+def test_decode_sliced_table():
+    batch = make_batch()
+    table = batch.to_arrow().slice(1, 2)
+
+    assert decoded_rows(table, batch.dimensions) == ROWS[1:]
+
+
+def test_extend_merges_batches_with_different_dictionaries():
+    merged = make_batch(ROWS[:1])
+    merged.extend(make_batch(ROWS[1:]))
+
+    assert decoded_rows(merged.to_arrow(), merged.dimensions) == ROWS
+    assert merged.partition_keys() == {('google_search_console', date(2026, 10, 10)),
+                                       ('google_analytics', date(2026, 10, 11))}
+
+
+def test_dimension_dictionary_persists_codes(tmp_path):
+    path = tmp_path / 'dimensions.json'
+    dimensions = DimensionDictionary(path)
+    codes = dimensions.encode_many('keyword', ['點擊遊戲', 'Click Fun', '點擊遊戲'])
+
+    reloaded = DimensionDictionary(path)
+
+    assert codes == [0, 1, 0]
+    assert reloaded.values('keyword') == ['點擊遊戲', 'Click Fun']
+    # 另一個實例配發的新編號接續檔案內容，不會重複使用編號
+    assert reloaded.encode('keyword', 'PWA遊戲') == 2
+    assert dimensions.encode('keyword', '免費遊戲') == 3
+    assert DimensionDictionary(path).values('keyword') == ['點擊遊戲', 'Click Fun', 'PWA遊戲', '免費遊戲']